@@ -1,65 +1,23 @@
-import os
-import pandas as pd
 import numpy as np
-import faiss
-from sklearn.manifold import TSNE
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
+from descriptorStore import load_descriptor_store
+from indexBackends import FaissIndex
+from indexCache import database_tag
+from tsneEmbedding import compute_embedding, load_or_compute_embedding
 
-class KNNEngine:
+class KNNEngine(FaissIndex):
     def __init__(self, feature_dim):
-        self.feature_dim = feature_dim
-        self.index = faiss.IndexFlatL2(self.feature_dim)
-
-    def build_index(self, features):
-        features = np.ascontiguousarray(features, dtype=np.float32)
-        self.index.add(features)
-
-    def query(self, query_vector, k=5):
-        query_vector = np.ascontiguousarray(query_vector.reshape(1, -1), dtype=np.float32)
-        distances, indices = self.index.search(query_vector, k + 1)  
-        indices, distances = indices[0][1:k+1], distances[0][1:k+1]  
-        return indices, distances
+        super().__init__(feature_dim, "Flat")
 
 class DimensionalityReducer:
     def __init__(self, features):
         self.features = features
 
     def apply_tsne(self):
-        tsne = TSNE(n_components=2, perplexity=30, n_iter=1000, random_state=42)
-        reduced_features = tsne.fit_transform(self.features)
-        return reduced_features
-
-def parse_descriptor_columns(df):
-    for col in ['A3', 'D1', 'D2', 'D3', 'D4']:
-        df[col] = df[col].apply(lambda x: np.fromstring(x, sep=','))
+        return compute_embedding(self.features)
 
-    feature_matrix = np.hstack([    
-        df['surfaceAreaObj'].values.reshape(-1, 1),
-        df['compactnessObj'].values.reshape(-1, 1),
-        df['rectangularityObj'].values.reshape(-1, 1),
-        df['diameterObj'].values.reshape(-1, 1),
-        df['convexityObj'].values.reshape(-1, 1),
-        df['eccentricityObj'].values.reshape(-1, 1),
-        np.vstack(df['A3'].values),
-        np.vstack(df['D1'].values),
-        np.vstack(df['D2'].values),
-        np.vstack(df['D3'].values),
-        np.vstack(df['D4'].values)
-    ])
-    return feature_matrix
-
-def load_descriptors(csv_filepath):
-    if os.path.exists(csv_filepath):
-        print("File found! Loading...")
-        df = pd.read_csv(csv_filepath)
-        feature_matrix = parse_descriptor_columns(df)
-        return df, feature_matrix
-    else:
-        print(f"File not found at: {csv_filepath}")
-        return None, None
-
-def visualize_tsne_2d(reduced_features, labels, highlight_index=None, title="t-SNE Visualization"):
+def visualize_tsne_2d(reduced_features, labels, highlight_index=None, title="t-SNE Visualization", block=False):
     plt.figure(figsize=(12, 8))
     unique_labels = np.unique(labels)
     colors = cm.get_cmap("tab20", len(unique_labels))
@@ -84,26 +42,29 @@ def visualize_tsne_2d(reduced_features, labels, highlight_index=None, title="t-S
     plt.grid(True)
     plt.tight_layout() 
 
-    plt.show()
+    # non-blocking by default, so the search results are returned while the plot is open
+    plt.show(block=block)
+    if not block:
+        plt.pause(0.001)
 
-def select_shape_by_name(df, filePath):
-    shape_name = filePath
-    selected_shape_idx = df[df['name'].str.lower() == shape_name.lower()].index
-    if len(selected_shape_idx) == 0:
+def select_shape_by_name(store, filePath):
+    selected_shape_idx = store.index_of(filePath)
+    if selected_shape_idx is None:
         print("Shape not found!")
-        return None
-    return selected_shape_idx[0]
+    return selected_shape_idx
 
-def methode(filePath):
+def methode(filePath, show_tsne=False):
     csv_filepath = r'MultimediaRetrieval\steps\AxelHoekje\dataBaseFinal.csv'
+    index_folder = r'MultimediaRetrieval\steps\AxelHoekje\faissIndexes'
 
-    df, features = load_descriptors(csv_filepath)
-    if df is None or features is None:
+    store = load_descriptor_store(csv_filepath)
+    if store is None:
         print("Failed to load descriptors. Exiting.")
         return
+    df, features = store.to_frame(), store.matrix
     knn = KNNEngine(feature_dim=features.shape[1])
-    knn.build_index(features)
-    selected_shape_idx = select_shape_by_name(df, filePath)
+    knn.build_index(features, cache_folder=index_folder, database=database_tag(csv_filepath))
+    selected_shape_idx = select_shape_by_name(store, filePath)
     if selected_shape_idx is None:
         return
     query_vector = features[selected_shape_idx]
@@ -117,8 +78,8 @@ def methode(filePath):
         shape_class = df.iloc[neighbor_idx]['class']
         combined_array.append([(f"{shape_class}/{shape_name}"), distances[i]])
         print(f"{i + 1}: Shape = {shape_name}, Class = {shape_class}, Distance = {distances[i]}")
-    dr = DimensionalityReducer(features)
-    reduced_features = dr.apply_tsne()
-    labels = df['class'].values
-    visualize_tsne_2d(reduced_features, labels, highlight_index=selected_shape_idx)  # Highlight the selected shape
+    if show_tsne:
+        # the embedding is computed once per database and saved next to it, a query only highlights its shape
+        reduced_features = load_or_compute_embedding(csv_filepath, features)
+        visualize_tsne_2d(reduced_features, df['class'].values, highlight_index=selected_shape_idx)
     return combined_array
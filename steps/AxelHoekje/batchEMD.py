@@ -0,0 +1,37 @@
+import numpy as np
+from scipy.spatial.distance import cdist
+
+############################################################################################
+# Batched 1-D earth mover's (Wasserstein) distance between one or more histograms and a database
+############################################################################################
+# source  --> (B,) histogram or (Q, B) histograms
+# result  --> (N,) distances or (Q, N) distances
+#
+# "samples": the original simple search semantics, scipy.stats.wasserstein_distance(source, target)
+#            with the histogram values used as samples. For two equally sized sample sets this is the
+#            mean absolute difference of the sorted values, so the database is sorted only once.
+# "bins":    the histograms as distributions over the shared bins, which is the L1 distance between
+#            their cumulative sums (in units of one bin).
+
+EMD_MODES = ["samples", "bins"]
+
+def prepare_targets(histograms, mode):
+    # the part of the work that only depends on the database
+    histograms = np.asarray(histograms, dtype=np.float64)
+    if mode == "samples":
+        return np.sort(histograms, axis=1)
+    if mode == "bins":
+        return np.cumsum(histograms, axis=1)
+    raise ValueError(f"unknown EMD mode {mode}, choose from {EMD_MODES}")
+
+def emd_to_prepared(source, prepared_targets, mode):
+    source = np.asarray(source)
+    prepared_source = prepare_targets(np.atleast_2d(source), mode)
+    # both modes are an L1 distance between the prepared rows, which cdist computes without (Q, N, B) temporaries
+    distances = cdist(prepared_source, prepared_targets, metric='cityblock')
+    if mode == "samples":
+        distances /= prepared_source.shape[1]
+    return distances[0] if source.ndim == 1 else distances
+
+def emd(source, histograms, mode="samples"):
+    return emd_to_prepared(source, prepare_targets(histograms, mode), mode)
@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from meshCache import file_hash
+from descriptorStore import SINGLE_VAL_FEATURES, HIST_FEATURES, convert_csv, min_max_scale
+from indexBackends import FaissIndex, index_from_config, load_ann_config, config_vector_builder
+from indexCache import database_tag
+
+############################################################################################
+# Database build pipeline: resample --> normalize --> extract --> standardize --> index
+############################################################################################
+# python MultimediaRetrieval\steps\AxelHoekje\buildDatabase.py [--workers N]
+#
+# resample, normalize and extract run per shape in a process pool. Every shape has a manifest
+# <work folder>/manifests/<class>/<name>.json with, per stage, the fingerprint (size, mtime, sha1) of its input,
+# its parameters and its output. A stage only runs again when its input or parameters changed (or its output is gone),
+# and the manifest is saved after every stage, so an interrupted or failed build resumes at the stage it stopped at
+# and adding shapes only processes the new ones.
+# the normalized meshes go to NORMALIZED_FOLDER, where the GUI (objLoaderFinal.py) loads its result previews from.
+# standardize and index run over the whole database in the parent process and are cheap.
+# standardize writes both databases: dataBaseFinal (z-scored single values, as step4) and dataBaseNormalised
+# (those single values min-max scaled on top, as _ANNEvaluation.ipynb), with their mean/std and min/max.
+
+SOURCE_FOLDER = "MultimediaRetrieval/ShapeDatabase_INFOMR-master"
+WORK_FOLDER = "MultimediaRetrieval/databaseBuild"
+NORMALIZED_FOLDER = "MultimediaRetrieval/NormalizedShapes-resampled"
+DATABASE_CSV = r'MultimediaRetrieval\steps\AxelHoekje\dataBaseFinal.csv'
+NORMALISED_DATABASE_CSV = r'MultimediaRetrieval\steps\AxelHoekje\dataBaseNormalised.csv'
+STANDARDIZATION_CSV = r'MultimediaRetrieval\steps\AxelHoekje\searchStandardizationData.csv'
+NORMALISATION_CSV = r'MultimediaRetrieval\steps\AxelHoekje\searchNormalisationData.csv'
+INDEX_FOLDER = r'MultimediaRetrieval\steps\AxelHoekje\faissIndexes'
+
+RESAMPLE_PARAMS = {"aim": 4000, "deviation": 0.9}
+
+############################################################################################
+# Manifests and fingerprints
+############################################################################################
+
+def manifest_path(work_folder, class_name, shape_name):
+    return os.path.join(work_folder, "manifests", class_name, shape_name + ".json")
+
+def read_manifest(path):
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def write_manifest(path, manifest):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # written to a temporary file first, so an interrupted build never leaves half a manifest behind
+    with open(path + ".tmp", 'w') as file:
+        json.dump(manifest, file)
+    os.replace(path + ".tmp", path)
+
+def fingerprint(path, previous=None):
+    stat = os.stat(path)
+    # only hash the file again when it looks like it has been touched
+    if previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns:
+        return previous
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": file_hash(path)}
+
+def is_done(stage, input_print, params, output_path=None):
+    # same input content, same parameters and the output is still there
+    return (stage is not None and stage["input"]["sha1"] == input_print["sha1"] and stage["params"] == params
+            and (output_path is None or os.path.isfile(output_path)))
+
+############################################################################################
+# Per shape stages (run in the worker processes)
+############################################################################################
+
+def resample_stage(source_path, class_name, shape_name, work_folder, params):
+    from dataResampleFinal import resample
+    output_folder = os.path.join(work_folder, "resampled")
+    os.makedirs(os.path.join(output_folder, class_name), exist_ok=True)
+    resample(shape_name, class_name, params["aim"], params["deviation"],
+             input_folder=os.path.dirname(os.path.dirname(source_path)), output_folder=output_folder)
+    return os.path.join(output_folder, class_name, shape_name)
+
+def normalize_stage(resampled_path, class_name, shape_name, normalized_folder):
+    from fullNormalize import ShapeNormalizer
+    output_path = os.path.join(normalized_folder, class_name, shape_name.replace('.obj', '_normalized.obj'))
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    normalizer = ShapeNormalizer()
+    normalizer.load_obj_file(resampled_path)
+    normalizer.normalize_shape()
+    normalizer.save_obj_file(output_path)
+    return output_path
+
+def extract_stage(normalized_path, class_name, shape_name):
+    from singleObjectCalcFinal import ObjectCalculations
+    shape = ObjectCalculations(normalized_path)
+    record = {"name": shape_name, "class": class_name}
+    for feature in SINGLE_VAL_FEATURES:
+        record[feature] = float(getattr(shape, feature))
+    for feature in HIST_FEATURES:
+        record[feature] = np.asarray(getattr(shape, feature), dtype=np.float64).tolist()
+    record["seed"] = shape.seed
+    record["samplerVersion"] = shape.sampler_version
+    return record
+
+def process_shape(task):
+    """Runs the stages of one shape that are out of date and returns its new manifest.
+    The manifest file is saved after every finished stage (only this worker handles this shape)."""
+    source_path, class_name, shape_name, work_folder, normalized_folder, manifest = task
+    from singleObjectCalcFinal import SAMPLER_VERSION
+    manifest = dict(manifest)
+    path = manifest_path(work_folder, class_name, shape_name)
+    ran = []
+
+    source_print = fingerprint(source_path, manifest.get("source"))
+    manifest["source"] = source_print
+
+    stage = manifest.get("resample")
+    if not is_done(stage, source_print, RESAMPLE_PARAMS, stage and stage["output"]):
+        stage = {"input": source_print, "params": RESAMPLE_PARAMS,
+                 "output": resample_stage(source_path, class_name, shape_name, work_folder, RESAMPLE_PARAMS)}
+        ran.append("resample")
+        manifest["resample"] = stage
+        write_manifest(path, manifest)
+
+    resampled_print = fingerprint(stage["output"], manifest.get("normalize", {}).get("input"))
+    normalize_params = {"folder": normalized_folder}
+    stage = manifest.get("normalize")
+    if not is_done(stage, resampled_print, normalize_params, stage and stage["output"]):
+        stage = {"input": resampled_print, "params": normalize_params,
+                 "output": normalize_stage(manifest["resample"]["output"], class_name, shape_name, normalized_folder)}
+        ran.append("normalize")
+        manifest["normalize"] = stage
+        write_manifest(path, manifest)
+
+    normalized_print = fingerprint(stage["output"], manifest.get("extract", {}).get("input"))
+    extract_params = {"samplerVersion": SAMPLER_VERSION}
+    stage = manifest.get("extract")
+    if not is_done(stage, normalized_print, extract_params):
+        stage = {"input": normalized_print, "params": extract_params,
+                 "record": extract_stage(manifest["normalize"]["output"], class_name, shape_name)}
+        ran.append("extract")
+        manifest["extract"] = stage
+    # also saves new fingerprints (a touched file with the same content)
+    write_manifest(path, manifest)
+    return class_name, shape_name, manifest, ran
+
+############################################################################################
+# Database wide stages (run in the parent process)
+############################################################################################
+
+def list_shapes(source_folder):
+    shapes = []
+    for class_name in sorted(os.listdir(source_folder)):
+        class_folder = os.path.join(source_folder, class_name)
+        if os.path.isdir(class_folder):
+            for shape_name in sorted(os.listdir(class_folder)):
+                if shape_name.lower().endswith('.obj'):
+                    shapes.append((os.path.join(class_folder, shape_name), class_name, shape_name))
+    return shapes
+
+def records_hash(records):
+    # identity of the database content, so standardize only runs again when a row was added, removed or changed
+    return hashlib.sha1(json.dumps(records, sort_keys=True).encode()).hexdigest()
+
+def histogram_cell(values):
+    return ','.join(map(str, values))
+
+def write_database(df, database_csv):
+    columns = ["name", "class"] + SINGLE_VAL_FEATURES + HIST_FEATURES + ["seed", "samplerVersion"]
+    df[columns].to_csv(database_csv, index=False)
+    convert_csv(database_csv)
+
+def standardize_stage(records, database_csv, normalised_database_csv, standardization_csv, normalisation_csv):
+    """Same standardization as step4/searchFeatureNormalization.py: |x - mean| / std for the single values,
+    then the min-max scaling of _ANNEvaluation.ipynb on top of that for the normalised database."""
+    df = pd.DataFrame(records)
+    standardization_data = {}
+    for feature in SINGLE_VAL_FEATURES:
+        mean, std = np.mean(df[feature]), np.std(df[feature])
+        standardization_data[feature] = {"mean": mean, "std": std}
+        df[feature] = np.abs((df[feature] - mean) / std)
+    for feature in HIST_FEATURES:
+        df[feature] = df[feature].map(histogram_cell)
+    write_database(df, database_csv)
+
+    normalised_df = df.copy()
+    normalisation_data = {}
+    for feature in SINGLE_VAL_FEATURES:
+        minimum, maximum = df[feature].min(), df[feature].max()
+        normalisation_data[feature] = {"min": minimum, "max": maximum}
+        normalised_df[feature] = min_max_scale(df[feature], minimum, maximum)
+    write_database(normalised_df, normalised_database_csv)
+
+    pd.DataFrame(standardization_data).to_csv(standardization_csv)
+    pd.DataFrame(normalisation_data).to_csv(normalisation_csv)
+    print(f"[Finished] standardize: {len(df)} shapes --> {database_csv}, {normalised_database_csv}")
+
+def index_stage(database_csv, normalised_database_csv, index_folder):
+    from descriptorStore import load_descriptor_store
+    # the exact index on the raw database, the configured ANN index on the normalised one (as SearchEngine uses them)
+    features = load_descriptor_store(database_csv).matrix
+    FaissIndex(features.shape[1], "Flat").build_index(features, cache_folder=index_folder, database=database_tag(database_csv))
+    ann_config = load_ann_config()
+    vector_builder = config_vector_builder(ann_config)
+    features = vector_builder.build(load_descriptor_store(normalised_database_csv).matrix)
+    index_from_config(features.shape[1], ann_config).build_index(features, cache_folder=index_folder,
+                                                                 database=database_tag(normalised_database_csv) + vector_builder.cache_tag())
+    print(f"[Finished] index: FAISS indexes up to date in {index_folder}")
+
+def build_database(source_folder=SOURCE_FOLDER, work_folder=WORK_FOLDER, database_csv=DATABASE_CSV,
+                   normalised_database_csv=NORMALISED_DATABASE_CSV, standardization_csv=STANDARDIZATION_CSV,
+                   normalisation_csv=NORMALISATION_CSV, index_folder=INDEX_FOLDER, normalized_folder=NORMALIZED_FOLDER, workers=None):
+    start = time.perf_counter()
+    shapes = list_shapes(source_folder)
+    tasks = [(source_path, class_name, shape_name, work_folder, normalized_folder,
+              read_manifest(manifest_path(work_folder, class_name, shape_name)))
+             for source_path, class_name, shape_name in shapes]
+    print(f"[Info] build: {len(tasks)} shapes in {source_folder}")
+
+    records = {}
+    changed = 0
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_shape, task): task for task in tasks}
+        for done, future in enumerate(as_completed(futures), 1):
+            task = futures[future]
+            try:
+                class_name, shape_name, manifest, ran = future.result()
+            except Exception as error:
+                failed.append(task[0])
+                print(f"[Warning] build: {task[0]} failed ({error}), it is left out of the database")
+                continue
+            records[(class_name, shape_name)] = manifest["extract"]["record"]
+            if ran:
+                changed += 1
+                print(f"[Info] build: {done}/{len(tasks)} {class_name}/{shape_name} ({', '.join(ran)})")
+
+    # deterministic row order, whatever order the workers finished in
+    records = [records[key] for key in sorted(records)]
+    outputs = [database_csv, normalised_database_csv, standardization_csv, normalisation_csv]
+    state_path = os.path.join(work_folder, "database.json")
+    state = {"records": records_hash(records), "outputs": outputs}
+    if read_manifest(state_path) != state or not all(map(os.path.isfile, outputs)):
+        standardize_stage(records, *outputs)
+        write_manifest(state_path, state)
+    else:
+        print("[Info] build: the database files already hold these shapes, nothing to standardize")
+    index_stage(database_csv, normalised_database_csv, index_folder)
+    print(f"[Finished] build: {changed} shapes (re)processed, {len(failed)} failed, {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resample, normalize, extract, standardize and index the shape database.")
+    parser.add_argument("--source", default=SOURCE_FOLDER)
+    parser.add_argument("--work", default=WORK_FOLDER)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    build_database(args.source, args.work, workers=args.workers)
@@ -8,11 +8,13 @@ import pymeshlab as ml
 # meshFile --> file path to object file from root folder
 # aim --> desired amount of vertices that the object will end up having
 # deviation --> tolerated amount of deviation from the aim (decimal)
-def resample(meshFile, meshClass, aim=4000, deviation=0.9, searchTask=False):
+# input_folder / output_folder --> dataset folders with one folder per class (the pipeline passes its own)
+def resample(meshFile, meshClass, aim=4000, deviation=0.9, searchTask=False,
+             input_folder="MultimediaRetrieval/ShapeDatabase_INFOMR-master", output_folder="ShapeDatabase_INFOMR-resampledV2"):
 
     # mesh initiation
     ms = ml.MeshSet()
-    ms.load_new_mesh("MultimediaRetrieval/ShapeDatabase_INFOMR-master/" + meshClass + "/" + meshFile)
+    ms.load_new_mesh(input_folder + "/" + meshClass + "/" + meshFile)
     vertices =  ms.current_mesh().vertex_number()
 
     # ------ Upsampling ------
@@ -111,7 +113,7 @@ def resample(meshFile, meshClass, aim=4000, deviation=0.9, searchTask=False):
 
     # save the resampled shape
     if searchTask == False:
-        ms.save_current_mesh("ShapeDatabase_INFOMR-resampledV2/" + meshClass + "/" + meshFile)
+        ms.save_current_mesh(output_folder + "/" + meshClass + "/" + meshFile)
     else:
         ms.save_current_mesh("temp.obj")
 
@@ -0,0 +1,139 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+from batchEMD import prepare_targets
+
+############################################################################################
+# Binary descriptor database: names, classes and one dense float32 feature matrix
+############################################################################################
+# <base>.npz         --> names, classes, bins (+ seed/samplerVersion when the CSV had them)
+# <base>.matrix.npy  --> N x (6 + 5 * bins) float32 matrix, opened memory-mapped
+# column order of the matrix: the 6 single-value features, then the A3, D1, D2, D3, D4 histograms
+
+SINGLE_VAL_FEATURES = ["surfaceAreaObj", "compactnessObj", "rectangularityObj", "diameterObj", "convexityObj", "eccentricityObj"]
+HIST_FEATURES = ["A3", "D1", "D2", "D3", "D4"]
+
+def min_max_scale(values, minimum, maximum):
+    # dataBaseNormalised = dataBaseFinal with min-max scaled single values (MinMaxScaler in _ANNEvaluation.ipynb),
+    # a constant column only gets shifted, like MinMaxScaler does
+    value_range = np.asarray(maximum, dtype=np.float64) - minimum
+    return (np.asarray(values, dtype=np.float64) - minimum) / np.where(value_range == 0, 1.0, value_range)
+
+def parse_histogram_column(column):
+    # every cell is "0.1,0.2,..." (or "[0.1, 0.2, ...]"), so join all of them and parse the numbers in one go
+    cells = column.astype(str).str.strip("[]() ")
+    values = np.fromstring(",".join(cells), dtype=np.float64, sep=',')
+    if len(values) % len(cells) != 0:
+        raise ValueError(f"histogram column {column.name} does not have the same amount of bins in every row")
+    return values.reshape(len(cells), -1)
+
+def parse_descriptor_columns(df):
+    if len(df) == 0:
+        return np.zeros((0, len(SINGLE_VAL_FEATURES)), dtype=np.float32)
+    feature_matrix = np.hstack(
+        [df[SINGLE_VAL_FEATURES].to_numpy(dtype=np.float64)] +
+        [parse_histogram_column(df[hist_feature]) for hist_feature in HIST_FEATURES]
+    )
+    return np.ascontiguousarray(feature_matrix, dtype=np.float32)
+
+def store_paths(base_path):
+    base_path = os.path.splitext(base_path)[0]
+    return base_path + ".npz", base_path + ".matrix.npy"
+
+class DescriptorStore:
+    def __init__(self, names, classes, matrix, seeds=None, sampler_versions=None):
+        self.names = np.asarray(names, dtype=str)
+        self.classes = np.asarray(classes, dtype=str)
+        self.matrix = matrix
+        self.bins = (matrix.shape[1] - len(SINGLE_VAL_FEATURES)) // len(HIST_FEATURES)
+        self.seeds = seeds
+        self.sampler_versions = sampler_versions
+        # sorted / cumulative histograms for the batched EMD, computed once per store
+        self.prepared_histograms = {}
+        # lowercase name --> row, built on the first lookup
+        self.name_index = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def scalar(self, feature):
+        return self.matrix[:, SINGLE_VAL_FEATURES.index(feature)]
+
+    def scalars(self):
+        return self.matrix[:, :len(SINGLE_VAL_FEATURES)]
+
+    def histogram(self, feature):
+        start = len(SINGLE_VAL_FEATURES) + HIST_FEATURES.index(feature) * self.bins
+        return self.matrix[:, start:start + self.bins]
+
+    def prepared_histogram(self, feature, mode):
+        key = (feature, mode)
+        if key not in self.prepared_histograms:
+            self.prepared_histograms[key] = prepare_targets(self.histogram(feature), mode)
+        return self.prepared_histograms[key]
+
+    def index_of(self, name):
+        """Row of a shape by (case-insensitive) name, or None when it is not in the database."""
+        if self.name_index is None:
+            self.name_index = {}
+            # reversed, so the first row wins for duplicate names like the old DataFrame scan
+            for row in range(len(self.names) - 1, -1, -1):
+                self.name_index[self.names[row].lower()] = row
+        return self.name_index.get(name.lower())
+
+    def to_frame(self):
+        # the name/class part that the search code uses to report results
+        return pd.DataFrame({"name": self.names, "class": self.classes})
+
+    @classmethod
+    def from_csv(cls, csv_filepath):
+        df = pd.read_csv(csv_filepath)
+        seeds = df["seed"].to_numpy(dtype=np.uint64) if "seed" in df else None
+        sampler_versions = df["samplerVersion"].to_numpy(dtype=np.int32) if "samplerVersion" in df else None
+        return cls(df["name"].to_numpy(), df["class"].to_numpy(), parse_descriptor_columns(df), seeds, sampler_versions)
+
+    def save(self, base_path):
+        meta_path, matrix_path = store_paths(base_path)
+        extra = {}
+        if self.seeds is not None:
+            extra["seed"] = self.seeds
+        if self.sampler_versions is not None:
+            extra["samplerVersion"] = self.sampler_versions
+        # the matrix goes first, so a store whose .npz exists is always complete
+        np.save(matrix_path, np.ascontiguousarray(self.matrix, dtype=np.float32))
+        np.savez(meta_path, names=self.names, classes=self.classes, bins=self.bins, **extra)
+
+    @classmethod
+    def load(cls, base_path, mmap=True):
+        meta_path, matrix_path = store_paths(base_path)
+        with np.load(meta_path, allow_pickle=False) as meta:
+            names, classes = meta["names"], meta["classes"]
+            seeds = meta["seed"] if "seed" in meta else None
+            sampler_versions = meta["samplerVersion"] if "samplerVersion" in meta else None
+        matrix = np.load(matrix_path, mmap_mode='r' if mmap else None)
+        return cls(names, classes, matrix, seeds, sampler_versions)
+
+def convert_csv(csv_filepath):
+    """One-time conversion of a descriptor CSV to the binary store next to it."""
+    store = DescriptorStore.from_csv(csv_filepath)
+    store.save(csv_filepath)
+    print(f"[Finished] descriptor store: {csv_filepath} --> {store_paths(csv_filepath)[0]} ({len(store)} shapes, {store.bins} bins)")
+    return store
+
+def load_descriptor_store(csv_filepath):
+    """Load the binary store belonging to a descriptor CSV, converting the CSV first when the store is missing or older."""
+    meta_path, matrix_path = store_paths(csv_filepath)
+    if os.path.exists(meta_path) and os.path.exists(matrix_path):
+        if not os.path.exists(csv_filepath) or os.path.getmtime(meta_path) >= os.path.getmtime(csv_filepath):
+            return DescriptorStore.load(csv_filepath)
+    if not os.path.exists(csv_filepath):
+        print(f"File not found at: {csv_filepath}")
+        return None
+    return convert_csv(csv_filepath)
+
+if __name__ == "__main__":
+    # python descriptorStore.py dataBaseFinal.csv dataBaseNormalised.csv
+    for csv_filepath in sys.argv[1:]:
+        convert_csv(csv_filepath)
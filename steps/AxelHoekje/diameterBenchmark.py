@@ -0,0 +1,49 @@
+import time
+import numpy as np
+from scipy.spatial import ConvexHull
+
+from singleObjectCalcFinal import farthest_pair_distance
+
+############################################################################################
+# Compares the old double loop diameter with farthest_pair_distance for growing hull sizes
+############################################################################################
+
+# the diameter() implementation before farthest_pair_distance, kept here as the reference
+def loop_diameter(hull_vertices):
+    max_distance = 0
+    num_hull_vertices = len(hull_vertices)
+    for i in range(num_hull_vertices):
+        for j in range(i + 1, num_hull_vertices):
+            distance = np.linalg.norm(hull_vertices[i] - hull_vertices[j])
+            if distance > max_distance:
+                max_distance = distance
+    return max_distance
+
+# random points on an ellipsoid, so (almost) every point ends up on the convex hull
+def ellipsoid_points(num_points, rng):
+    points = rng.normal(size=(num_points, 3))
+    points /= np.linalg.norm(points, axis=1, keepdims=True)
+    return points * np.array([1.0, 0.6, 0.3])
+
+def benchmark(hull_sizes, loop_limit=2000, repeats=3):
+    rng = np.random.default_rng(42)
+    for num_points in hull_sizes:
+        points = ellipsoid_points(num_points, rng)
+        hull_vertices = points[ConvexHull(points).vertices]
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            fast = farthest_pair_distance(hull_vertices)
+        fast_time = (time.perf_counter() - start) / repeats
+
+        # the double loop becomes unbearably slow for large hulls
+        if len(hull_vertices) <= loop_limit:
+            start = time.perf_counter()
+            slow = loop_diameter(hull_vertices)
+            slow_time = time.perf_counter() - start
+            print(f"[Info] hull={len(hull_vertices):6d} loop={slow_time:9.4f}s blocked={fast_time:8.5f}s speedup={slow_time / fast_time:9.1f}x equal={np.isclose(fast, slow)}")
+        else:
+            print(f"[Info] hull={len(hull_vertices):6d} loop=  skipped blocked={fast_time:8.5f}s")
+
+if __name__ == "__main__":
+    benchmark([100, 250, 500, 1000, 2000, 5000, 10000, 20000])
@@ -0,0 +1,69 @@
+import json
+import hashlib
+import numpy as np
+
+from descriptorStore import SINGLE_VAL_FEATURES, HIST_FEATURES
+
+############################################################################################
+# Turns descriptor rows (parse_descriptor_columns / DescriptorStore.matrix) into FAISS vectors
+############################################################################################
+# the plain rows are 6 z-scored scalars + 5 x bins histogram values, so under L2 the histograms
+# (99% of the dimensions) decide almost everything. The builder can:
+#   weights          --> multiply every block (a scalar feature or a whole histogram) by a weight
+#   equalize_blocks  --> divide every histogram block by sqrt(bins), so a histogram counts like one scalar
+#   hellinger        --> take the square root of the histogram bins (L2 on them is the Hellinger distance)
+#   cumulative       --> append the cumulative sum of every histogram, L2 on those approximates the EMD
+# the default builder returns the rows unchanged
+
+class FeatureVectorBuilder:
+    def __init__(self, weights=None, equalize_blocks=False, hellinger=False, cumulative=False, cumulative_weight=1.0):
+        self.weights = dict(weights or {})
+        unknown = set(self.weights) - set(SINGLE_VAL_FEATURES + HIST_FEATURES)
+        if unknown:
+            raise ValueError(f"unknown features in weights: {sorted(unknown)}")
+        self.equalize_blocks = equalize_blocks
+        self.hellinger = hellinger
+        self.cumulative = cumulative
+        self.cumulative_weight = cumulative_weight
+
+    def config(self):
+        return {"weights": self.weights, "equalize_blocks": self.equalize_blocks, "hellinger": self.hellinger,
+                "cumulative": self.cumulative, "cumulative_weight": self.cumulative_weight}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(**(config or {}))
+
+    def cache_tag(self):
+        # part of the FAISS index cache key, empty for the plain rows
+        if self.is_identity():
+            return ""
+        return "_vectors" + hashlib.sha1(json.dumps(self.config(), sort_keys=True).encode()).hexdigest()[:8]
+
+    def is_identity(self):
+        return not (any(weight != 1.0 for weight in self.weights.values()) or self.equalize_blocks or self.hellinger or self.cumulative)
+
+    def build(self, matrix):
+        """N x D float32 vectors for N descriptor rows (a single row gives a 1 x D result)."""
+        matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float32))
+        if self.is_identity():
+            return np.ascontiguousarray(matrix)
+
+        num_single = len(SINGLE_VAL_FEATURES)
+        bins = (matrix.shape[1] - num_single) // len(HIST_FEATURES)
+        block_scale = 1.0 / np.sqrt(bins) if self.equalize_blocks else 1.0
+
+        scalars = matrix[:, :num_single] * np.array([self.weights.get(feature, 1.0) for feature in SINGLE_VAL_FEATURES], dtype=np.float32)
+        blocks = [scalars]
+        cumulative_blocks = []
+        for i, hist_feature in enumerate(HIST_FEATURES):
+            histogram = matrix[:, num_single + i * bins:num_single + (i + 1) * bins]
+            scale = self.weights.get(hist_feature, 1.0) * block_scale
+            if self.hellinger:
+                # bins are frequencies, tiny negative values only come from rounding
+                blocks.append(np.sqrt(np.clip(histogram, 0, None)) * scale)
+            else:
+                blocks.append(histogram * scale)
+            if self.cumulative:
+                cumulative_blocks.append(np.cumsum(histogram, axis=1) * (scale * self.cumulative_weight))
+        return np.ascontiguousarray(np.hstack(blocks + cumulative_blocks), dtype=np.float32)
@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+import numpy as np
+import faiss
+
+from descriptorStore import load_descriptor_store
+from simpleSearch import search_many
+from featureVectors import FeatureVectorBuilder
+
+# the leave-one-out helpers live with the evaluation scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "step6"))
+from retrievalEvaluation import drop_self
+
+############################################################################################
+# How close exact L2 search on differently built vectors gets to the simple search ranking
+############################################################################################
+# for every shape (leave-one-out): class precision@k and the overlap of the top k with the simple search top k
+
+CONFIGS = {
+    "plain": {},
+    "equalized": {"equalize_blocks": True},
+    "hellinger": {"equalize_blocks": True, "hellinger": True},
+    "cumulative": {"equalize_blocks": True, "cumulative": True},
+    "hellinger+cumulative": {"equalize_blocks": True, "hellinger": True, "cumulative": True},
+}
+
+def benchmark(csv_filepath, k=10):
+    store = load_descriptor_store(csv_filepath)
+    classes = store.classes
+
+    start = time.perf_counter()
+    # k + 1 and the query itself removed, for the simple search and FAISS alike
+    simple_ranking = drop_self(search_many(store.matrix, store, k=k + 1)[0])
+    print(f"[Info] simple search: precision@{k}={np.mean(classes[simple_ranking] == classes[:, None]):.4f} ({time.perf_counter() - start:.2f}s)")
+
+    for name, config in CONFIGS.items():
+        start = time.perf_counter()
+        vectors = FeatureVectorBuilder.from_config(config).build(store.matrix)
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors)
+        _, ranking = index.search(vectors, k + 1)
+        ranking = drop_self(ranking)
+        elapsed = time.perf_counter() - start
+
+        precision = np.mean(classes[ranking] == classes[:, None])
+        overlap = np.mean([len(np.intersect1d(a, b)) / k for a, b in zip(ranking, simple_ranking)])
+        print(f"[Info] {name:22s} dims={vectors.shape[1]:5d} precision@{k}={precision:.4f} overlap={overlap:.4f} ({elapsed:.2f}s)")
+
+if __name__ == "__main__":
+    benchmark(r'MultimediaRetrieval\steps\AxelHoekje\dataBaseFinal.csv')
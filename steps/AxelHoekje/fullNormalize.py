@@ -1,5 +1,6 @@
 import numpy as np
 import os
+from meshCache import load_mesh
 from tkinter import Tk
 from tkinter.filedialog import askopenfilename
 
@@ -9,15 +10,9 @@ class ShapeNormalizer:
         self.faces = []
 
     def load_obj_file(self, fileName):
-        self.vertices = []
-        self.faces = []
-        with open(fileName, 'r') as file:
-            for line in file:
-                if line.startswith('v '):  # Read vertex
-                    self.vertices.append(list(map(float, line.strip().split()[1:])))
-                elif line.startswith('f '):  # Read face
-                    self.faces.append([int(idx.split('/')[0]) - 1 for idx in line.strip().split()[1:]])
-        self.vertices = np.array(self.vertices)  # Convert to numpy array for easier manipulation
+        vertices, faces = load_mesh(fileName, stage="resampled")
+        self.faces = np.array(faces)  # a copy, so the cache file is not kept mapped
+        self.vertices = vertices.astype(np.float64)  # Keep the normalization math in double precision
 
     def update(self):
         pass  # You can add any real-time viewer updates here if needed
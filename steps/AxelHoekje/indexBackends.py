@@ -0,0 +1,137 @@
+import os
+import json
+import numpy as np
+import faiss
+
+from indexCache import load_or_build_index
+from featureVectors import FeatureVectorBuilder
+
+############################################################################################
+# One FAISS index interface for every search engine, the backend is picked by name + parameters
+############################################################################################
+# Flat      --> exact L2, float32 vectors                                  (advancedSearch, step6/eval.py)
+# IVFFlat   --> inverted lists over k-means cells, float32 vectors          (searchANN, step6/evalMetANN.py)
+# HNSWFlat  --> graph search, float32 vectors plus the graph links
+# IVFPQ     --> inverted lists with product-quantized vectors, m bytes per shape at nbits=8
+# SQ        --> exact search over scalar-quantized vectors (QT_8bit: 1 byte per value, QT_fp16: 2)
+#
+# build parameters change the index itself and are part of the index cache key,
+# search parameters (nprobe, efSearch) are applied after building or loading
+
+BACKENDS = {
+    "Flat": {"build": {}, "search": {}},
+    "IVFFlat": {"build": {"nlist": 100}, "search": {"nprobe": 10}},
+    "HNSWFlat": {"build": {"M": 32, "efConstruction": 40}, "search": {"efSearch": 64}},
+    "IVFPQ": {"build": {"nlist": 100, "m": 48, "nbits": 8}, "search": {"nprobe": 10}},
+    "SQ": {"build": {"qtype": "QT_8bit"}, "search": {}},
+}
+
+ANN_CONFIG = r'MultimediaRetrieval\steps\AxelHoekje\annConfig.json'
+DEFAULT_ANN_CONFIG = {"backend": "IVFFlat", "nlist": 100, "nprobe": 10}
+
+def load_ann_config(config_path=ANN_CONFIG):
+    # written by ivfTuning.py (or by hand for another backend), the old hardcoded IVFFlat settings without it
+    config = dict(DEFAULT_ANN_CONFIG)
+    if config_path is not None and os.path.exists(config_path):
+        with open(config_path, 'r') as file:
+            config.update(json.load(file))
+    return config
+
+def config_vector_builder(config):
+    """FeatureVectorBuilder the ANN config was tuned with ("vector_builder" in annConfig.json), plain rows without it."""
+    return FeatureVectorBuilder.from_config(config.get("vector_builder"))
+
+def backend_params(backend, params):
+    """Default build and search parameters of a backend, overridden by the known keys of params."""
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown index backend {backend}, choose from {list(BACKENDS)}")
+    build = {key: params.get(key, value) for key, value in BACKENDS[backend]["build"].items()}
+    search = {key: params.get(key, value) for key, value in BACKENDS[backend]["search"].items()}
+    return build, search
+
+class FaissIndex:
+    def __init__(self, feature_dim, backend="Flat", **params):
+        self.feature_dim = feature_dim
+        self.backend = backend
+        self.build_params, self.search_params = backend_params(backend, params)
+        # product quantization needs the dimension to be a multiple of m, the zero padding does not change L2
+        m = self.build_params.get("m", 1)
+        self.index_dim = -(-feature_dim // m) * m
+        self.index = self.create_index()
+        self.apply_search_params()
+
+    def create_index(self):
+        d, params = self.index_dim, self.build_params
+        if self.backend == "Flat":
+            return faiss.IndexFlatL2(d)
+        if self.backend == "IVFFlat":
+            return faiss.IndexIVFFlat(faiss.IndexFlatL2(d), d, params["nlist"])
+        if self.backend == "HNSWFlat":
+            index = faiss.IndexHNSWFlat(d, params["M"])
+            index.hnsw.efConstruction = params["efConstruction"]
+            return index
+        if self.backend == "IVFPQ":
+            return faiss.IndexIVFPQ(faiss.IndexFlatL2(d), d, params["nlist"], params["m"], params["nbits"])
+        return faiss.IndexScalarQuantizer(d, getattr(faiss.ScalarQuantizer, params["qtype"]))
+
+    def fit_to(self, num_vectors):
+        # k-means needs at least as many training points as clusters: nlist lists, 2^nbits codes per PQ sub-quantizer
+        if self.backend == "IVFPQ" and num_vectors < 2 ** self.build_params["nbits"]:
+            print(f"[Warning] index: {num_vectors} shapes are too few to train IVFPQ, using Flat instead")
+            self.backend, self.build_params, self.search_params = "Flat", {}, {}
+            self.index_dim = self.feature_dim
+        elif self.build_params.get("nlist", 0) > num_vectors:
+            print(f"[Warning] index: nlist={self.build_params['nlist']} is more than the {num_vectors} shapes, using nlist={num_vectors}")
+            self.build_params["nlist"] = num_vectors
+            self.search_params["nprobe"] = min(self.search_params["nprobe"], num_vectors)
+        else:
+            return
+        self.index = self.create_index()
+
+    def apply_search_params(self):
+        if "nprobe" in self.search_params:
+            faiss.extract_index_ivf(self.index).nprobe = self.search_params["nprobe"]
+        if "efSearch" in self.search_params:
+            self.index.hnsw.efSearch = self.search_params["efSearch"]
+
+    def cache_key(self):
+        # e.g. IVFFlat_nlist100, IVFPQ_nlist100_m48_nbits8
+        return "_".join([self.backend] + [f"{key}{value}" for key, value in self.build_params.items()])
+
+    def prepare(self, vectors):
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if self.index_dim != vectors.shape[1]:
+            vectors = np.pad(vectors, ((0, 0), (0, self.index_dim - vectors.shape[1])))
+        return np.ascontiguousarray(vectors)
+
+    def build_index(self, features, cache_folder=None, database=None):
+        self.fit_to(len(features))
+        features = self.prepare(features)
+        if cache_folder is not None:
+            # reuse the index saved for this database, only train/add when the database changed
+            # database: tag of the features (indexCache.database_tag), so indexes of other databases are not replaced
+            index_key = self.cache_key() if database is None else f"{database}_{self.cache_key()}"
+            self.index = load_or_build_index(self.index, features, index_key, cache_folder)
+        else:
+            if not self.index.is_trained:
+                self.index.train(features)
+            self.index.add(features)
+        self.apply_search_params()
+
+    def search(self, query_matrix, k):
+        """Batched k nearest neighbours, distances and indices are both Q x k."""
+        return self.index.search(self.prepare(query_matrix), k)
+
+    def query(self, query_vector, k=5, skip_self=True):
+        if not skip_self:
+            # out-of-sample query (a shape that is not in the database), so the first hit is a real neighbour
+            distances, indices = self.search(query_vector, k)
+            return indices[0], distances[0]
+        distances, indices = self.search(query_vector, k + 1)
+        indices, distances = indices[0][1:k+1], distances[0][1:k+1]
+        return indices, distances
+
+def index_from_config(feature_dim, config):
+    """FaissIndex for a config dict like annConfig.json: {"backend": ..., <parameters>}, extra keys are ignored."""
+    config = dict(config)
+    return FaissIndex(feature_dim, config.pop("backend", "IVFFlat"), **config)
@@ -0,0 +1,42 @@
+import time
+import numpy as np
+import faiss
+
+from descriptorStore import load_descriptor_store
+from indexBackends import FaissIndex
+
+############################################################################################
+# Memory, build time, recall@k (against Flat) and QPS of every index backend on the current database
+############################################################################################
+# pick one and put it in annConfig.json, e.g. {"backend": "HNSWFlat", "M": 32, "efSearch": 64}
+
+CONFIGS = [
+    ("Flat", {}),
+    ("IVFFlat", {"nlist": 100, "nprobe": 10}),
+    ("HNSWFlat", {"M": 32, "efConstruction": 40, "efSearch": 64}),
+    ("IVFPQ", {"nlist": 100, "nprobe": 10, "m": 48, "nbits": 8}),
+    ("SQ", {"qtype": "QT_8bit"}),
+    ("SQ", {"qtype": "QT_fp16"}),
+]
+
+def benchmark(csv_filepath, k=10):
+    vectors = np.ascontiguousarray(load_descriptor_store(csv_filepath).matrix, dtype=np.float32)
+    exact = None
+    for backend, params in CONFIGS:
+        start = time.perf_counter()
+        index = FaissIndex(vectors.shape[1], backend, **params)
+        index.build_index(vectors)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, found = index.search(vectors, k)
+        qps = len(vectors) / (time.perf_counter() - start)
+        if exact is None:
+            exact = found
+        recall = np.mean([len(np.intersect1d(a, b)) / k for a, b in zip(found, exact)])
+
+        size = len(faiss.serialize_index(index.index))
+        print(f"[Info] {index.cache_key():32s} size={size / 2**20:8.2f}MB build={build_time:7.2f}s recall@{k}={recall:.4f} QPS={qps:9.0f}")
+
+if __name__ == "__main__":
+    benchmark(r'MultimediaRetrieval\steps\AxelHoekje\dataBaseNormalised.csv')
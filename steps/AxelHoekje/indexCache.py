@@ -0,0 +1,58 @@
+import os
+import re
+import hashlib
+import numpy as np
+import faiss
+
+############################################################################################
+# FAISS indexes saved to disk, keyed by the index parameters and a hash of the descriptor database
+############################################################################################
+# <cache_folder>/<index key>_<database hash>.faiss
+# the index key names the database (database_tag) and the index parameters, so indexes of different databases
+# never share a key. A changed database gives a new hash for the same key, so the old file is never loaded again (and is removed)
+
+def features_hash(features):
+    features = np.ascontiguousarray(features, dtype=np.float32)
+    feature_hash = hashlib.sha1(str(features.shape).encode())
+    feature_hash.update(features.tobytes())
+    return feature_hash.hexdigest()[:16]
+
+def database_tag(csv_filepath):
+    # base name of the database CSV, for the Windows style paths of this repo as well
+    return os.path.splitext(re.split(r'[\\/]', csv_filepath)[-1])[0]
+
+def read_index(index_path, mmap=True):
+    if mmap:
+        try:
+            return faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # not every index type / faiss version can be memory-mapped
+            pass
+    return faiss.read_index(index_path)
+
+def load_or_build_index(index, features, index_key, cache_folder, mmap=True):
+    """The saved index for these features and parameters, otherwise train/fill the given empty index and save it."""
+    features = np.ascontiguousarray(features, dtype=np.float32)
+    index_path = os.path.join(cache_folder, f"{index_key}_{features_hash(features)}.faiss")
+    if os.path.exists(index_path):
+        print(f"[Info] index cache: loading {index_path}")
+        return read_index(index_path, mmap)
+
+    if not index.is_trained:
+        index.train(features)
+    index.add(features)
+
+    os.makedirs(cache_folder, exist_ok=True)
+    # only older versions of exactly this key (same database, same parameters) are stale
+    stale_name = re.compile(re.escape(index_key) + r"_[0-9a-f]{16}\.faiss")
+    for stale_file in filter(stale_name.fullmatch, os.listdir(cache_folder)):
+        try:
+            os.remove(os.path.join(cache_folder, stale_file))
+        except OSError:
+            # still opened by another process, it is simply never picked again
+            pass
+    # write to a temporary file first, so an interrupted write never looks like a valid index
+    faiss.write_index(index, index_path + ".tmp")
+    os.replace(index_path + ".tmp", index_path)
+    print(f"[Finished] index cache: saved {index_path}")
+    return index
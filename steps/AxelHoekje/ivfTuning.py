@@ -0,0 +1,100 @@
+import sys
+import json
+import time
+import numpy as np
+import faiss
+
+from descriptorStore import load_descriptor_store
+from featureVectors import FeatureVectorBuilder
+from indexBackends import ANN_CONFIG
+
+############################################################################################
+# Sweeps nlist/nprobe of the IVF index on the current database and saves the best configuration
+############################################################################################
+# recall@k --> share of the exact IndexFlatL2 top k that the IVF index returns, every shape used as query once
+# QPS      --> queries per second of one batched search over all shapes
+# out of the recall/QPS Pareto front the fastest configuration that reaches the target recall is written to
+# annConfig.json, which searchANN.methode and SearchEngine load (nlist=100, nprobe=10 without it)
+
+NORMALISED_DATABASE_CSV = r'MultimediaRetrieval\steps\AxelHoekje\dataBaseNormalised.csv'
+
+def nlist_candidates(num_shapes):
+    # around sqrt(N), the usual rule of thumb, plus the old hardcoded 100
+    root = np.sqrt(num_shapes)
+    candidates = {max(1, int(root * factor)) for factor in (0.25, 0.5, 1, 2, 4)} | {100}
+    # k-means needs a reasonable amount of points per list, a tiny database still gets a single list
+    return sorted(nlist for nlist in candidates if nlist * 10 <= num_shapes) or [1]
+
+def timed_search(index, vectors, k, repeats=3):
+    # best of a few runs, a single batched search is short enough to be disturbed by anything else
+    best_time = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        _, indices = index.search(vectors, k)
+        best_time = min(best_time, time.perf_counter() - start)
+    return indices, len(vectors) / best_time
+
+def recall_at_k(found, expected):
+    hits = sum(len(np.intersect1d(a[a >= 0], b)) for a, b in zip(found, expected))
+    return hits / expected.size
+
+def sweep(vectors, k=10, nlists=None, nprobes=(1, 2, 4, 8, 16, 32, 64, 128)):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    exact_index = faiss.IndexFlatL2(vectors.shape[1])
+    exact_index.add(vectors)
+    exact, exact_qps = timed_search(exact_index, vectors, k)
+    print(f"[Info] exact IndexFlatL2: {exact_qps:.0f} QPS")
+
+    results = []
+    for nlist in nlists or nlist_candidates(len(vectors)):
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(vectors.shape[1]), vectors.shape[1], nlist)
+        index.train(vectors)
+        index.add(vectors)
+        for nprobe in nprobes:
+            if nprobe > nlist:
+                break
+            index.nprobe = nprobe
+            found, qps = timed_search(index, vectors, k)
+            result = {"nlist": nlist, "nprobe": nprobe, "recall": recall_at_k(found, exact), "qps": qps}
+            results.append(result)
+            print(f"[Info] nlist={nlist:5d} nprobe={nprobe:4d} recall@{k}={result['recall']:.4f} QPS={qps:9.0f}")
+    return results, exact_qps
+
+def pareto_front(results):
+    # a configuration stays when no faster configuration has at least the same recall
+    front = []
+    for result in sorted(results, key=lambda result: (-result["qps"], -result["recall"])):
+        if not front or result["recall"] > front[-1]["recall"]:
+            front.append(result)
+    return front
+
+def choose(front, target_recall):
+    reaching = [result for result in front if result["recall"] >= target_recall]
+    if reaching:
+        return max(reaching, key=lambda result: result["qps"])
+    return max(front, key=lambda result: result["recall"])
+
+def tune(csv_filepath=NORMALISED_DATABASE_CSV, config_path=ANN_CONFIG, k=10, target_recall=0.95, vector_builder=None):
+    store = load_descriptor_store(csv_filepath)
+    vector_builder = vector_builder or FeatureVectorBuilder()
+    vectors = vector_builder.build(store.matrix)
+    results, exact_qps = sweep(vectors, k=k)
+
+    front = pareto_front(results)
+    print("[Info] Pareto front:")
+    for result in front:
+        print(f"       nlist={result['nlist']:5d} nprobe={result['nprobe']:4d} recall@{k}={result['recall']:.4f} QPS={result['qps']:9.0f}")
+
+    best = choose(front, target_recall)
+    config = {"backend": "IVFFlat", "nlist": best["nlist"], "nprobe": best["nprobe"], "recall": best["recall"], "qps": best["qps"],
+              "exact_qps": exact_qps, "k": k, "target_recall": target_recall, "num_shapes": len(store),
+              # the vectors nlist/nprobe were tuned on, the ANN search builds its vectors the same way
+              "vector_builder": vector_builder.config()}
+    with open(config_path, 'w') as file:
+        json.dump(config, file, indent=4)
+    print(f"[Finished] IVF tuning: nlist={best['nlist']} nprobe={best['nprobe']} (recall@{k}={best['recall']:.4f}) --> {config_path}")
+    return config
+
+if __name__ == "__main__":
+    # python ivfTuning.py [target recall]
+    tune(target_recall=float(sys.argv[1]) if len(sys.argv) > 1 else 0.95)
@@ -0,0 +1,72 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+from meshReader import read_obj
+
+############################################################################################
+# Binary mesh cache: vertices and faces of a parsed OBJ stored as .npy files beside it
+############################################################################################
+# <folder>/.meshcache/<name>.<stage>.vertices.npy  --> float32 (N, 3), opened memory-mapped
+# <folder>/.meshcache/<name>.<stage>.faces.npy     --> int32 (M, 3), opened memory-mapped
+# <folder>/.meshcache/<name>.<stage>.json          --> source path, size, mtime and sha1 of the OBJ
+
+CACHE_FOLDER = ".meshcache"
+
+def cache_paths(obj_file, stage):
+    folder = os.path.join(os.path.dirname(os.path.abspath(obj_file)), CACHE_FOLDER)
+    prefix = os.path.join(folder, f"{os.path.basename(obj_file)}.{stage}")
+    return folder, prefix + ".vertices.npy", prefix + ".faces.npy", prefix + ".json"
+
+def file_hash(obj_file):
+    with open(obj_file, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+def is_fresh(obj_file, meta_path):
+    if not os.path.isfile(meta_path):
+        return False
+    with open(meta_path, 'r') as file:
+        meta = json.load(file)
+    stat = os.stat(obj_file)
+    # cheap check first, only hash the OBJ again when it looks like it has been touched
+    if meta["size"] == stat.st_size and meta["mtime_ns"] == stat.st_mtime_ns:
+        return True
+    if meta["size"] != stat.st_size or meta["sha1"] != file_hash(obj_file):
+        return False
+    # same content with a new timestamp, remember the new timestamp
+    meta["mtime_ns"] = stat.st_mtime_ns
+    with open(meta_path, 'w') as file:
+        json.dump(meta, file)
+    return True
+
+def save_mesh_cache(obj_file, vertices, faces, stage):
+    folder, vertices_path, faces_path, meta_path = cache_paths(obj_file, stage)
+    os.makedirs(folder, exist_ok=True)
+    if os.path.isfile(meta_path):
+        os.remove(meta_path)
+    stat = os.stat(obj_file)
+    np.save(vertices_path, np.ascontiguousarray(vertices, dtype=np.float32))
+    np.save(faces_path, np.ascontiguousarray(faces, dtype=np.int32))
+    # the meta file is written last, so a half written cache is never seen as fresh
+    meta = {"source": os.path.abspath(obj_file), "stage": stage, "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns, "sha1": file_hash(obj_file)}
+    with open(meta_path, 'w') as file:
+        json.dump(meta, file)
+
+def load_mesh(obj_file, stage="mesh"):
+    """Vertices and faces of an OBJ file, memory-mapped from the binary cache when it is fresh."""
+    _, vertices_path, faces_path, meta_path = cache_paths(obj_file, stage)
+    try:
+        if is_fresh(obj_file, meta_path):
+            return np.load(vertices_path, mmap_mode='r'), np.load(faces_path, mmap_mode='r')
+    except (OSError, ValueError, KeyError):
+        # broken cache, just parse the OBJ again and overwrite it
+        pass
+
+    vertices, faces = read_obj(obj_file)
+    try:
+        save_mesh_cache(obj_file, vertices, faces, stage)
+    except OSError:
+        print(f"[Warning] mesh cache: could not write the cache for {obj_file}")
+    return vertices, faces
@@ -0,0 +1,70 @@
+import re
+import numpy as np
+
+############################################################################################
+# Shared OBJ reader: reads the whole file at once and tokenizes the v/f records in bulk
+############################################################################################
+
+# strips the /vt/vn part of "f 1/2/3 4/5/6 7/8/9" style face entries
+FACE_ATTRIBUTES = re.compile(rb'/[^\s]*')
+WHITESPACE = np.frombuffer(b' \t\r\n\v\f', dtype=np.uint8)
+# the rest of every "v ..." and "f ..." line, found by one regex pass over the whole file
+VERTEX_RECORDS = re.compile(rb'^v[ \t]+([^\r\n]*)', re.M)
+FACE_RECORDS = re.compile(rb'^f[ \t]+([^\r\n]*)', re.M)
+
+def parse_vertices(vertex_lines):
+    if not vertex_lines:
+        return np.zeros((0, 3), dtype=np.float32)
+    values = np.fromstring(b' '.join(vertex_lines), dtype=np.float32, sep=' ')
+    # the common case: every vertex line has as many numbers as the first one (x y z, optionally w or colors)
+    values_per_line = len(vertex_lines[0].split())
+    if len(values) == values_per_line * len(vertex_lines):
+        return np.ascontiguousarray(values.reshape(len(vertex_lines), values_per_line)[:, :3])
+    return np.array([line.split()[:3] for line in vertex_lines], dtype=np.float32)
+
+def count_tokens_per_line(data, num_lines):
+    # a token starts wherever a non-whitespace byte follows whitespace (or the start of the data)
+    characters = np.frombuffer(data, dtype=np.uint8)
+    whitespace = np.isin(characters, WHITESPACE)
+    token_starts = ~whitespace & np.concatenate([[True], whitespace[:-1]])
+    line_numbers = np.cumsum(characters == ord('\n'), dtype=np.int32)
+    return np.bincount(line_numbers[token_starts], minlength=num_lines).astype(np.int32)
+
+def parse_polygons(face_lines, num_vertices):
+    if not face_lines:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+    face_data = FACE_ATTRIBUTES.sub(b'', b'\n'.join(face_lines))
+    indices = np.fromstring(face_data, dtype=np.int64, sep=' ')
+    sizes = count_tokens_per_line(face_data, len(face_lines))
+    # OBJ is 1-based, negative indices count back from the end of the vertex list
+    indices = np.where(indices < 0, indices + num_vertices, indices - 1)
+    return indices.astype(np.int32), sizes
+
+def triangulate(indices, sizes):
+    # triangles only, nothing to do
+    if np.all(sizes == 3):
+        return indices.reshape(-1, 3)
+    # fan triangulation: polygon (p0, p1, ..., pn) becomes (p0, p1, p2), (p0, p2, p3), ...
+    sizes = sizes.astype(np.int64)
+    starts = np.cumsum(sizes) - sizes
+    triangle_counts = np.maximum(sizes - 2, 0)
+    polygon_of_triangle = np.repeat(np.arange(len(sizes)), triangle_counts)
+    first_triangle = np.cumsum(triangle_counts) - triangle_counts
+    corner = np.arange(len(polygon_of_triangle)) - first_triangle[polygon_of_triangle] + 1
+    polygon_start = starts[polygon_of_triangle]
+    return np.stack([indices[polygon_start],
+                     indices[polygon_start + corner],
+                     indices[polygon_start + corner + 1]], axis=1)
+
+def read_obj_polygons(obj_file):
+    """Vertices (float32, Nx3), flat polygon indices (int32) and the size of every polygon."""
+    with open(obj_file, 'rb') as file:
+        data = file.read()
+    vertices = parse_vertices(VERTEX_RECORDS.findall(data))
+    indices, sizes = parse_polygons(FACE_RECORDS.findall(data), len(vertices))
+    return vertices, indices, sizes
+
+def read_obj(obj_file):
+    """Vertices (float32, Nx3) and triangulated faces (int32, Mx3) of an OBJ file."""
+    vertices, indices, sizes = read_obj_polygons(obj_file)
+    return vertices, np.ascontiguousarray(triangulate(indices, sizes), dtype=np.int32)
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import numpy as np
+
+from meshReader import read_obj
+
+############################################################################################
+# Compares the old line by line OBJ loaders with meshReader.read_obj on a whole shape database
+############################################################################################
+
+# the loader every module used before meshReader, kept here as the reference
+def line_by_line_obj(obj_file):
+    vertices = []
+    faces = []
+    with open(obj_file, 'r') as file:
+        for line in file:
+            if line.startswith('v '):
+                vertices.append(list(map(float, line.strip().split()[1:])))
+            elif line.startswith('f '):
+                faces.append([int(idx.split('/')[0]) - 1 for idx in line.strip().split()[1:]])
+    return vertices, faces
+
+def benchmark(folder):
+    obj_files = []
+    for root, dirs, files in os.walk(folder):
+        for file in files:
+            if file.lower().endswith('.obj'):
+                obj_files.append(os.path.join(root, file))
+
+    if not obj_files:
+        print(f"[Error] benchmark: no .obj files found in {folder}")
+        return
+
+    old_time = 0.0
+    new_time = 0.0
+    mismatches = 0
+    for obj_file in obj_files:
+        start = time.perf_counter()
+        old_vertices, old_faces = line_by_line_obj(obj_file)
+        old_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        vertices, faces = read_obj(obj_file)
+        new_time += time.perf_counter() - start
+
+        # polygon meshes are triangulated by read_obj, so only compare the plain triangle meshes
+        if all(len(face) == 3 for face in old_faces) and all(len(vertex) == 3 for vertex in old_vertices):
+            if not (np.allclose(old_vertices, vertices, rtol=1e-6, atol=1e-6) and np.array_equal(old_faces, faces)):
+                mismatches += 1
+                print(f"[Warning] benchmark: {obj_file} differs")
+
+    print(f"[Finished] benchmark: {len(obj_files)} files, line by line {old_time:.2f}s, read_obj {new_time:.2f}s "
+          f"({old_time / new_time:.1f}x faster), {mismatches} mismatches")
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else "MultimediaRetrieval/ShapeDatabase_INFOMR-master"
+    benchmark(folder)
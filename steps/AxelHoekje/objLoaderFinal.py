@@ -13,9 +13,10 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 import matplotlib.pyplot as plt
 from dataResampleFinal import resample
 from fullNormalize import ShapeNormalizer
-from simpleSearch import searchObject
 import re
-from searchANN import methode
+from searchEngine import SearchEngine
+from meshCache import load_mesh
+from buildDatabase import NORMALIZED_FOLDER
 
 class SmallerWidget(QGLWidget):
     def __init__(self, parent=None):
@@ -38,16 +39,11 @@ class SmallerWidget(QGLWidget):
         self.distance_label = ""
         
     def load_obj_file(self, fileName, distance):
-        self.vertices = []
-        self.faces = []
         self.file_name = os.path.join(os.path.basename(os.path.dirname(fileName)), os.path.basename(fileName))
         self.distance_label = (f"Distance = {distance}")
-        with open(fileName, 'r') as file:
-            for line in file:
-                if line.startswith('v '):
-                    self.vertices.append(list(map(float, line.strip().split()[1:])))
-                elif line.startswith('f '):
-                    self.faces.append([int(idx.split('/')[0]) - 1 for idx in line.strip().split()[1:]])
+        #copies, so the cache files are not kept mapped (the next query rewrites temp.obj and its cache, which Windows refuses while mapped)
+        vertices, faces = load_mesh(fileName, stage="normalized")
+        self.vertices, self.faces = np.array(vertices), np.array(faces)
         self.update()      
 
     def initializeGL(self):
@@ -205,14 +201,9 @@ class OpenGLWidget(QGLWidget):
     
         
     def load_obj_file(self, fileName):    
-        self.vertices = []
-        self.faces = []
-        with open(fileName, 'r') as file:
-            for line in file:
-                if line.startswith('v '):
-                    self.vertices.append(list(map(float, line.strip().split()[1:])))
-                elif line.startswith('f '):
-                    self.faces.append([int(idx.split('/')[0]) - 1 for idx in line.strip().split()[1:]])
+        #copies, see SmallerWidget.load_obj_file
+        vertices, faces = load_mesh(fileName, stage="normalized")
+        self.vertices, self.faces = np.array(vertices), np.array(faces)
         self.update()      
 
     def initializeGL(self):
@@ -358,6 +349,8 @@ class MainWindow(QMainWindow):
         self.opengl_widget.setFixedSize(1650, 600)  #Fixed size
 
         self.opengl_widgets_small = [SmallerWidget(self) for _ in range(5)]
+        #The descriptor databases are loaded once, on the first search (the viewer also works without them)
+        self.search_engine = None
         for widget in self.opengl_widgets_small:
             widget.setFixedSize(300, 300)
 
@@ -533,17 +526,35 @@ class MainWindow(QMainWindow):
             return new_filename
         return filename
     
+    def get_search_engine(self):
+        if self.search_engine is None:
+            try:
+                self.search_engine = SearchEngine()
+            except FileNotFoundError as error:
+                print(f"[Warning] {error}")
+        return self.search_engine
+
     def perform_simple_search(self):
+        search_engine = self.get_search_engine()
+        if search_engine is None:
+            return
         allDescriptors = self.shape.getAllDescriptors()
-        result = searchObject(100000, 93, allDescriptors)
-        results = result.distances[0:5]
+        results = search_engine.query(allDescriptors, k=5)
         distances = np.array(results['closeness'])
         filtered_results = np.array(results[['name', 'class']])
         combined = [f"{row[1]}/{row[0]}" for row in filtered_results]
         self.displaySmallerWidgets(combined, distances)
 
     def perform_adv_search(self):
-        combined_array = methode(os.path.basename(self.fileName))
+        search_engine = self.get_search_engine()
+        if search_engine is None:
+            return
+        shape_name = os.path.basename(self.fileName)
+        if search_engine.normalised_store.index_of(shape_name) is not None:
+            combined_array = search_engine.ann_search(shape_name)
+        else:
+            # a shape that is not in the database, search with its own standardized features
+            combined_array = search_engine.ann_query(self.shape.getAllDescriptors())
         results = []
         distances = []
 
@@ -590,7 +601,8 @@ class MainWindow(QMainWindow):
     def displaySmallerWidgets(self, results, distances):
         for widget, filePathOld, distance in zip(self.opengl_widgets_small, results, distances):
             filePath = self.insert_string(filePathOld,"_normalized")
-            widget.load_obj_file("MultimediaRetrieval/NormalizedShapes-resampled/"+filePath, distance)
+            #same folder buildDatabase.py writes the normalized meshes to
+            widget.load_obj_file(os.path.join(NORMALIZED_FOLDER, filePath), distance)
             widget.toggle_vertices()
             widget.toggle_faces()
             widget.toggle_edges_on()
@@ -626,7 +638,8 @@ class MainWindow(QMainWindow):
             self.faces_display.setText(str(self.opengl_widget.get_faces_count()))
             #Calculate descriptors
             self.shape = ObjectCalculations(resampled_normalised_fileName)
-            self.shape.normalizeFeatures()            
+            #reuses the standardization data of the search engine once it is loaded, reads the CSV otherwise
+            self.shape.normalizeFeatures(self.search_engine.standardization if self.search_engine is not None else None)            
             self.surface_area_display.setText(str(self.shape.surfaceAreaObj))
             self.compactness_display.setText(str(self.shape.compactnessObj))
             self.rectangularity_display.setText(str(self.shape.rectangularityObj))
@@ -0,0 +1,34 @@
+import time
+import numpy as np
+
+from searchEngine import SearchEngine
+
+############################################################################################
+# Two-stage search (C ANN candidates re-ranked by the simple search) against the exhaustive simple search
+############################################################################################
+# every database shape is used as a query, recall@k = share of the exhaustive top k that the two-stage top k finds
+
+def recall_at_k(found, expected):
+    return np.mean([len(np.intersect1d(a, b)) / len(b) for a, b in zip(found, expected)])
+
+def benchmark(candidate_counts=(50, 100, 200, 400, 800), reference_sizes=(256, 1024, None), k=10):
+    engine = SearchEngine(show_tsne=False)
+    # dataBaseFinal rows, as the simple search needs them (rerank_many moves them into the ANN space for the candidates)
+    queries = np.asarray(engine.store.matrix, dtype=np.float64)
+    engine.ann_index()
+
+    start = time.perf_counter()
+    exact, _ = engine.search_many(queries, k=k)
+    exact_time = time.perf_counter() - start
+    print(f"[Info] exhaustive: {len(queries)} queries in {exact_time:.2f}s")
+
+    for reference_size in reference_sizes:
+        for candidates in candidate_counts:
+            start = time.perf_counter()
+            found, _ = engine.rerank_many(queries, k=k, candidates=candidates, reference_size=reference_size)
+            elapsed = time.perf_counter() - start
+            print(f"[Info] C={candidates:4d} reference={str(reference_size):>5s} recall@{k}={recall_at_k(found, exact):.4f} "
+                  f"time={elapsed:.2f}s speedup={exact_time / elapsed:.1f}x")
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+
+from descriptorStore import load_descriptor_store, min_max_scale, SINGLE_VAL_FEATURES, HIST_FEATURES
+from simpleSearch import searchObject, search_many, feature_vector, rerank
+from searchANN import visualize_tsne_2d
+from advancedSearch import KNNEngine
+from indexBackends import index_from_config, load_ann_config, config_vector_builder, ANN_CONFIG
+from tsneEmbedding import BackgroundEmbedding
+from indexCache import database_tag
+
+############################################################################################
+# Long-lived search engine: loads the databases once and keeps the built indexes around
+############################################################################################
+# construct it once (the GUI does this in MainWindow) and call query / ann_search per search,
+# so a search only costs the distance computation itself
+
+DATABASE_CSV = r'MultimediaRetrieval\steps\AxelHoekje\dataBaseFinal.csv'
+NORMALISED_DATABASE_CSV = r'MultimediaRetrieval\steps\AxelHoekje\dataBaseNormalised.csv'
+STANDARDIZATION_CSV = r'MultimediaRetrieval\steps\AxelHoekje\searchStandardizationData.csv'
+INDEX_FOLDER = r'MultimediaRetrieval\steps\AxelHoekje\faissIndexes'
+
+class SearchEngine:
+    def __init__(self, database_csv=DATABASE_CSV, normalised_database_csv=NORMALISED_DATABASE_CSV,
+                 standardization_csv=STANDARDIZATION_CSV, bins=93, n=100000, emd="samples", index_folder=INDEX_FOLDER,
+                 show_tsne=True, vector_builder=None, ann_config=ANN_CONFIG):
+        self.bins = bins
+        self.n = n
+        self.emd = emd
+        # FAISS indexes are saved here and only rebuilt when the database changes (None disables this)
+        self.index_folder = index_folder
+        # ANN backend and its parameters (annConfig.json, IVFFlat chosen by ivfTuning.py by default)
+        self.ann_config = load_ann_config(ann_config)
+        # how descriptor rows become FAISS vectors (block weights, Hellinger, cumulative blocks),
+        # by default the builder annConfig.json was tuned with (plain rows without one)
+        self.vector_builder = vector_builder if vector_builder is not None else config_vector_builder(self.ann_config)
+        # simple search and exact KNN use the raw database, the ANN the completely normalised one
+        # index cache tags: the database, plus the vector builder when it changes the rows
+        self.database_tag = database_tag(database_csv) + self.vector_builder.cache_tag()
+        self.normalised_database_tag = database_tag(normalised_database_csv) + self.vector_builder.cache_tag()
+        self.store = load_descriptor_store(database_csv)
+        self.normalised_store = load_descriptor_store(normalised_database_csv)
+        if self.store is None or self.normalised_store is None:
+            missing = database_csv if self.store is None else normalised_database_csv
+            raise FileNotFoundError(f"search engine: descriptor database {missing} not found, build it with buildDatabase.py first")
+        self.standardization = pd.read_csv(standardization_csv)
+        # min/max of the standardized single values, the ANN index lives in that min-max scaled space
+        scalars = np.asarray(self.store.scalars(), dtype=np.float64)
+        self.scalar_min, self.scalar_max = scalars.min(axis=0), scalars.max(axis=0)
+        self.ann = None
+        self.knn = None
+        # row in store for every row in normalised_store, for re-ranking ANN candidates
+        self.ann_to_store = None
+        self.reference_cache = {}
+        # the t-SNE plot of the ANN search: loaded (or computed once) in the background, never per search
+        self.embedding = BackgroundEmbedding(normalised_database_csv, self.normalised_store.matrix) if show_tsne else None
+        print(f"[Finished] search engine: {len(self.store)} shapes loaded")
+
+    # ------ Simple search ------
+    def query(self, features, k=5):
+        """Top k of the simple (EMD + single-value) search for an already standardized feature list."""
+        result = searchObject(self.n, self.bins, features, store=self.store, standardization=self.standardization,
+                              emd=self.emd, k=k, save_csv=False)
+        return result.distances[0:k]
+
+    def search_many(self, query_matrix, k=10):
+        """Top k indices and closeness of the simple search for every row of a query matrix laid out like the database."""
+        return search_many(query_matrix, self.store, k=k, emd=self.emd)
+
+    # ------ Two-stage search: ANN candidates, re-ranked by the simple search ------
+    def reference_rows(self, reference_size):
+        # fixed random rows to estimate the EMD mean/std of the simple search z-score, None uses every row (exact)
+        if reference_size is None or reference_size >= len(self.store):
+            return None
+        if reference_size not in self.reference_cache:
+            self.reference_cache[reference_size] = np.sort(np.random.default_rng(42).choice(len(self.store), reference_size, replace=False))
+        return self.reference_cache[reference_size]
+
+    def ann_candidates(self, query_matrix, candidates):
+        if self.ann_to_store is None:
+            rows = [self.store.index_of(name) for name in self.normalised_store.names]
+            self.ann_to_store = np.array([-1 if row is None else row for row in rows], dtype=np.int64)
+        # the query rows are laid out like dataBaseFinal, the ANN index searches in the space of dataBaseNormalised
+        _, ann_rows = self.ann_index().search(self.vector_builder.build(self.normalised_rows(query_matrix)), candidates)
+        # faiss pads with -1 when the probed lists hold fewer than C shapes
+        return np.where(ann_rows < 0, -1, self.ann_to_store[ann_rows])
+
+    def rerank_many(self, query_matrix, k=10, candidates=200, reference_size=1024):
+        """Top k indices and closeness like search_many, but the simple search only scores the top C ANN candidates."""
+        query_matrix = np.atleast_2d(np.asarray(query_matrix, dtype=np.float64))
+        return rerank(query_matrix, self.ann_candidates(query_matrix, candidates), self.store, k=k, emd=self.emd,
+                      reference=self.reference_rows(reference_size))
+
+    def rerank_query(self, features, k=5, candidates=200, reference_size=1024):
+        """Same result format as query (name, class, closeness), at the cost of an ANN search plus C distances."""
+        indices, closeness = self.rerank_many(self.feature_row(features), k, candidates, reference_size)
+        indices, closeness = indices[0][indices[0] >= 0], closeness[0][indices[0] >= 0]
+        return pd.DataFrame({"name": self.store.names[indices], "class": self.store.classes[indices], "closeness": closeness})
+
+    # ------ FAISS searches ------
+    def ann_index(self):
+        # built on the first ANN search and reused afterwards
+        if self.ann is None:
+            features = self.vector_builder.build(self.normalised_store.matrix)
+            self.ann = index_from_config(features.shape[1], self.ann_config)
+            self.ann.build_index(features, cache_folder=self.index_folder, database=self.normalised_database_tag)
+        return self.ann
+
+    def knn_index(self):
+        if self.knn is None:
+            features = self.vector_builder.build(self.store.matrix)
+            self.knn = KNNEngine(feature_dim=features.shape[1])
+            self.knn.build_index(features, cache_folder=self.index_folder, database=self.database_tag)
+        return self.knn
+
+    def find_shape(self, store, shape_name):
+        selected_shape_idx = store.index_of(shape_name)
+        if selected_shape_idx is None:
+            print("Shape not found!")
+        return selected_shape_idx
+
+    def normalised_rows(self, query_matrix):
+        """Rows laid out like dataBaseFinal (standardized) moved into the space of dataBaseNormalised, for the ANN index."""
+        query_matrix = np.array(np.atleast_2d(query_matrix), dtype=np.float64)
+        single_values = len(SINGLE_VAL_FEATURES)
+        query_matrix[:, :single_values] = min_max_scale(query_matrix[:, :single_values], self.scalar_min, self.scalar_max)
+        return query_matrix
+
+    def feature_row(self, features):
+        # a features dict (ObjectCalculations.features) or the getAllDescriptors() tuple, as one database row
+        if not isinstance(features, dict):
+            features = dict(zip(SINGLE_VAL_FEATURES + HIST_FEATURES, features))
+        return feature_vector(features)
+
+    def report(self, store, neighbors, distances):
+        print("Nearest Neighbors:")
+        combined_array = []
+        for i, neighbor_idx in enumerate(neighbors):
+            shape_name = store.names[neighbor_idx]
+            shape_class = store.classes[neighbor_idx]
+            combined_array.append([(f"{shape_class}/{shape_name}"), distances[i]])
+            print(f"{i + 1}: Shape = {shape_name}, Class = {shape_class}, Distance = {distances[i]}")
+        return combined_array
+
+    def faiss_search(self, engine, store, shape_name, k, show_tsne):
+        selected_shape_idx = self.find_shape(store, shape_name)
+        if selected_shape_idx is None:
+            return None
+        neighbors, distances = engine.query(self.vector_builder.build(store.matrix[selected_shape_idx])[0], k=k)
+
+        print(f"Query shape: {store.names[selected_shape_idx]}")
+        combined_array = self.report(store, neighbors, distances)
+
+        if show_tsne and self.embedding is not None:
+            if self.embedding.ready():
+                visualize_tsne_2d(self.embedding.embedding, self.normalised_store.classes, highlight_index=selected_shape_idx)
+            else:
+                print("[Info] t-SNE embedding is still being computed, no plot for this search")
+        return combined_array
+
+    def ann_search(self, shape_name, k=5, show_tsne=True):
+        """Same result as searchANN.methode, without reloading the database or retraining the index."""
+        return self.faiss_search(self.ann_index(), self.normalised_store, shape_name, k, show_tsne)
+
+    def knn_search(self, shape_name, k=5):
+        """Same result as advancedSearch.methode, without reloading the database or rebuilding the index."""
+        return self.faiss_search(self.knn_index(), self.store, shape_name, k, show_tsne=False)
+
+    def ann_query(self, features, k=5):
+        """ANN search for a shape that does not have to be in the database, from its standardized features
+        (ObjectCalculations.normalizeFeatures), against the same persistent index as ann_search."""
+        query_vector = self.vector_builder.build(self.normalised_rows(self.feature_row(features)))[0]
+        neighbors, distances = self.ann_index().query(query_vector, k=k, skip_self=False)
+        print("Query shape: (features)")
+        return self.report(self.normalised_store, neighbors, distances)
+
+    def knn_query(self, features, k=5):
+        """Exact counterpart of ann_query on the raw database."""
+        neighbors, distances = self.knn_index().query(self.vector_builder.build(self.feature_row(features))[0], k=k, skip_self=False)
+        print("Query shape: (features)")
+        return self.report(self.store, neighbors, distances)
@@ -1,4 +1,5 @@
 import os
+import csv
 
 import pymeshlab as ml # this import has to be over here, even though it appears like its not being used
 
@@ -11,8 +12,9 @@ from tkinter.filedialog import askopenfilename
 from fullNormalize import ShapeNormalizer
 from dataResampleFinal import resample
 from singleObjectCalcFinal import ObjectCalculations
+from descriptorStore import load_descriptor_store, SINGLE_VAL_FEATURES, HIST_FEATURES
 
-from scipy.stats import wasserstein_distance
+from batchEMD import emd_to_prepared, prepare_targets
 
 # 1. ask for INPUT .obj file
 # 2. resample and normalize INPUT
@@ -22,11 +24,132 @@ from scipy.stats import wasserstein_distance
 # 5. calculate similarity between INPUT and DATASET by normalization [0, &] or [0, 1]
 
 
+def feature_vector(features):
+    # same column order as the rows of a DescriptorStore matrix: single-value features, then the histograms
+    return np.concatenate([np.array([features[single_val_feature] for single_val_feature in SINGLE_VAL_FEATURES], dtype=np.float64)] +
+                          [np.asarray(features[hist_feature], dtype=np.float64) for hist_feature in HIST_FEATURES])
+
+def feature_distances(queries, store, emd="samples"):
+    """Q x 11 x N simple search distances (z-scored EMD per query, then the single-value differences)."""
+    queries = np.atleast_2d(queries)
+    num_single = len(SINGLE_VAL_FEATURES)
+    # the database axis is last, so every feature of every query is one contiguous row
+    distances = np.empty((len(queries), len(HIST_FEATURES) + num_single, len(store)))
+
+    # earth movers distance (hist features), every query against every object from the dataset at once
+    for column, hist_feature in enumerate(HIST_FEATURES):
+        start = num_single + column * store.bins
+        sources = queries[:, start:start + store.bins]
+        targets = store.prepared_histogram(hist_feature, emd)
+        distances[:, column, :] = np.sqrt(emd_to_prepared(sources, targets, emd))
+
+    # distance single-value features
+    distances[:, len(HIST_FEATURES):, :] = np.abs(queries[:, :num_single, None] - store.scalars().T[None, :, :])
+
+    # standardize hist features per query so they can be compared properly
+    # (single-value features are ignored since they have already been normalized)
+    hist_distances = distances[:, :len(HIST_FEATURES), :]
+    hist_distances -= hist_distances.mean(axis=2, keepdims=True)
+    hist_distances /= hist_distances.std(axis=2, keepdims=True)
+    return distances
+
+def candidate_distances(queries, candidates, store, emd="samples", reference=None):
+    """Q x 11 x C simple search distances from every query to only its own C candidate rows (Q x C indices).
+    The EMD is z-scored with its mean/std over the reference rows, over all rows (exact) when reference is None."""
+    queries = np.atleast_2d(queries)
+    num_single = len(SINGLE_VAL_FEATURES)
+    distances = np.empty((len(queries), len(HIST_FEATURES) + num_single, candidates.shape[1]))
+
+    for column, hist_feature in enumerate(HIST_FEATURES):
+        start = num_single + column * store.bins
+        sources = queries[:, start:start + store.bins]
+        targets = store.prepared_histogram(hist_feature, emd)
+        # same L1 between prepared rows as emd_to_prepared, but only for the Q x C candidate pairs
+        candidate_emd = np.abs(prepare_targets(sources, emd)[:, None, :] - targets[candidates]).sum(axis=2)
+        if emd == "samples":
+            candidate_emd /= store.bins
+        hist_distances = np.sqrt(candidate_emd)
+
+        # the z-score needs the distribution of the distances over the database, estimated on the reference rows
+        reference_distances = np.sqrt(emd_to_prepared(sources, targets if reference is None else targets[reference], emd))
+        hist_distances -= reference_distances.mean(axis=1, keepdims=True)
+        hist_distances /= reference_distances.std(axis=1, keepdims=True)
+        distances[:, column, :] = hist_distances
+
+    distances[:, len(HIST_FEATURES):, :] = np.abs(queries[:, :num_single, None] - store.scalars()[candidates].transpose(0, 2, 1))
+    return distances
+
+def rerank(query_matrix, candidates, store, k=10, emd="samples", reference=None, max_block=2**22):
+    """Top k of the candidate rows (Q x C indices into the store, -1 for none) by the simple search closeness."""
+    query_matrix = np.atleast_2d(np.asarray(query_matrix, dtype=np.float64))
+    candidates = np.atleast_2d(candidates)
+    k = min(k, candidates.shape[1])
+    missing = candidates < 0
+    candidates = np.where(missing, 0, candidates)
+    indices = np.empty((len(query_matrix), k), dtype=np.int64)
+    closeness = np.empty((len(query_matrix), k))
+    # the Q x C x bins EMD temporaries are the largest, keep them within max_block values
+    query_chunk = max(1, max_block // (candidates.shape[1] * store.bins))
+    for start in range(0, len(query_matrix), query_chunk):
+        stop = start + query_chunk
+        chunk_closeness = np.abs(candidate_distances(query_matrix[start:stop], candidates[start:stop], store, emd, reference)).mean(axis=1)
+        chunk_closeness[missing[start:stop]] = np.inf
+        best = top_k(chunk_closeness, k)
+        indices[start:stop] = np.take_along_axis(candidates[start:stop], best, axis=1)
+        closeness[start:stop] = np.take_along_axis(chunk_closeness, best, axis=1)
+    # fewer than k real candidates
+    indices[np.isinf(closeness)] = -1
+    return indices, closeness
+
+def top_k(closeness, k):
+    # per row the indices of the k smallest values in ascending order, k=None sorts the whole row
+    if k is None or k >= closeness.shape[1]:
+        return np.argsort(closeness, axis=1, kind="stable")
+    best = np.argpartition(closeness, k - 1, axis=1)[:, :k]
+    order = np.argsort(np.take_along_axis(closeness, best, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(best, order, axis=1)
+
+def search_many(query_matrix, store, k=10, emd="samples", max_block=2**22):
+    """Top k database indices and closeness values for every row of a Q x (6 + 5 * bins) query matrix."""
+    query_matrix = np.atleast_2d(np.asarray(query_matrix, dtype=np.float64))
+    k = min(k, len(store))
+    indices = np.empty((len(query_matrix), k), dtype=np.int64)
+    closeness = np.empty((len(query_matrix), k))
+    # a chunk of queries at a time keeps the chunk x 11 x N distance matrix within max_block values
+    query_chunk = max(1, max_block // (len(store) * (len(SINGLE_VAL_FEATURES) + len(HIST_FEATURES))))
+    for start in range(0, len(query_matrix), query_chunk):
+        chunk_closeness = np.abs(feature_distances(query_matrix[start:start + query_chunk], store, emd)).mean(axis=1)
+        best = top_k(chunk_closeness, k)
+        indices[start:start + len(best)] = best
+        closeness[start:start + len(best)] = np.take_along_axis(chunk_closeness, best, axis=1)
+    return indices, closeness
+
+def write_ranking(file_path, names, classes, closeness, ranking, chunk_size=50000):
+    # write "name,class,closeness" rows in ranking order, chunk by chunk
+    with open(file_path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["name", "class", "closeness"])
+        for start in range(0, len(ranking), chunk_size):
+            chunk = ranking[start:start + chunk_size]
+            writer.writerows(zip(names[chunk], classes[chunk], closeness[chunk].tolist()))
+
+
 class searchObject:
-    def __init__(self, bins, n, search_object_features):
+    def __init__(self, bins, n, search_object_features, store=None, standardization=None, emd="samples", k=None, save_csv=True):
         self.bins = bins
         self.n = n
 
+        # k=None keeps the full ranking, otherwise only the k closest objects are selected
+        self.k = k
+        self.save_csv = save_csv
+
+        # "samples" keeps the original wasserstein_distance(values, values) semantics, "bins" compares the histograms over their bins
+        self.emd = emd
+
+        # a SearchEngine hands over its already loaded database and standardization data
+        self.store = store
+        self.standardization = standardization
+
         self.single_val_features = ["surfaceAreaObj","compactnessObj","rectangularityObj","diameterObj","convexityObj","eccentricityObj"]
         self.hist_features = ["A3","D1","D2","D3","D4"]
 
@@ -35,16 +158,16 @@ class searchObject:
         self.features = {}
 
         self.distances = {}
+        self.distance_matrix = None
 
         self.load(search_object_features)
 
 
     def load(self, search_object_features):
-        # Hide the main tkinter window
-        root = Tk()
-        root.withdraw()
-        
-        if search_object_features == None:
+        if search_object_features is None:
+            # Hide the main tkinter window
+            root = Tk()
+            root.withdraw()
 
             # Open file dialog to select a file
             file_path = askopenfilename(
@@ -115,7 +238,9 @@ class searchObject:
         del self.features['obb_volume']
 
         # load values to standardize with
-        df_features_means_stds = pd.read_csv("MultimediaRetrieval\steps\AxelHoekje\searchStandardizationData.csv")
+        df_features_means_stds = self.standardization
+        if df_features_means_stds is None:
+            df_features_means_stds = pd.read_csv("MultimediaRetrieval\steps\AxelHoekje\searchStandardizationData.csv")
 
         # standardize single-value features (hist features already done)
         for single_val_feature in self.single_val_features:
@@ -131,7 +256,9 @@ class searchObject:
 
 
     def compare(self):
-        df = pd.read_csv("MultimediaRetrieval\steps\AxelHoekje\dataBaseFinal.csv")
+        store = self.store
+        if store is None:
+            store = load_descriptor_store("MultimediaRetrieval\steps\AxelHoekje\dataBaseFinal.csv")
 
         # euclidean distance (hist features)
         # distance_features = {}
@@ -151,72 +278,27 @@ class searchObject:
             
         #     distance_features[hist_feature] = distance_feature
 
-        # earth movers distance (hist features)
-        distance_features = {}
-        for hist_feature in self.hist_features:
-            source = np.array(self.features[hist_feature])
-            targets = df[hist_feature]
-
-            # iterate every object from the dataset
-            distance_feature = []
-            for target in targets:
-                target = np.array(eval(target))
-                
-                d = wasserstein_distance(source, target)
-                
-                distance_feature.append(np.sqrt(d))
-            
-            distance_features[hist_feature] = distance_feature
-
-
-        # distance single-value features
-        for single_val_feature in self.single_val_features:
-            source = self.features[single_val_feature]
-            targets = df[single_val_feature]
-
-            # iterate every object from the dataset
-            distance_feature = []
-            for target in targets:
-                distance_feature.append(abs(source - target))
-
-            distance_features[single_val_feature] = distance_feature
-
-        # standardize hist features so they can be compared properly
-        standardized_distance_features = {"name": df["name"].to_list(),
-                                          "class": df["class"].to_list()}
-        for distance_feature_key, distance_feature_values in distance_features.items():
-            if distance_feature_key in self.hist_features:
-                mean = np.mean(distance_feature_values)
-                std = np.std(distance_feature_values)
-
-                # iterate every single value of a single feature
-                standardized_distance_feature = []
-                for distance_feature_value in distance_feature_values:
-                    standardized_distance_feature.append((distance_feature_value - mean) / std)
-
-                standardized_distance_features[distance_feature_key] = standardized_distance_feature
-            # ignore single-value features since they have already been normalized
-            else:
-                standardized_distance_features[distance_feature_key] = distance_feature_values
-
+        # N x 11 distance matrix, columns in the order of self.hist_features + self.single_val_features
+        distance_matrix = feature_distances(feature_vector(self.features)[None, :], store, self.emd)[0].T
 
         # save the data
-        self.distances = standardized_distance_features
+        self.store = store
+        self.distance_matrix = distance_matrix
 
     def combineFeatureDistances(self):
-        df_distances = pd.DataFrame(self.distances)
+        # make all distance values positive and grab the mean distance from all features of a single object (row mean)
+        closeness = np.abs(self.distance_matrix).mean(axis=1)
 
-        # make all distance values positive
-        df_distances = pd.concat([df_distances[["name", "class"]], df_distances.iloc[ :, 2:13].abs()], axis=1)
-        
-        # df_distances = df_distances.drop(["D1"], axis=1)
+        # only the k best objects have to be sorted, unless the whole ranking is needed
+        ranking = top_k(closeness[None, :], self.k)[0]
 
-        # grab mean distance from all features of a single object (row mean)
-        df_distances["closeness"] = df_distances.iloc[ :, 2:13].mean(axis=1) # 7 to skip hist features
-        # print(df_distances)
         # update distances
-        self.distances = df_distances[["name", "class", "closeness"]]
-        self.distances = self.distances.sort_values(["closeness"], ascending=True)
-        self.distances.to_csv("searchResult.csv", index=False)
+        self.distances = pd.DataFrame({"name": self.store.names[ranking],
+                                       "class": self.store.classes[ranking],
+                                       "closeness": closeness[ranking]}, index=ranking)
+        # the full ranking on disk is only written when asked for, streamed without building a second DataFrame
+        if self.save_csv:
+            full_ranking = ranking if len(ranking) == len(closeness) else np.argsort(closeness, kind="stable")
+            write_ranking("searchResult.csv", self.store.names, self.store.classes, closeness, full_ranking)
 
         print("[Finished] distances: feature distance computations done")
@@ -1,16 +1,103 @@
 import numpy as np
-import random
 import csv
 import os
 from scipy.spatial import ConvexHull
 from math import pi
 import pandas as pd
-import multiprocessing
+import hashlib
+from functools import cached_property
+from meshCache import load_mesh
+
+#bump whenever the way A3/D2/D3/D4 samples are drawn changes, so stored histograms can be told apart
+SAMPLER_VERSION = 1
+#every histogram gets its own random stream so the results do not depend on the order they are computed in
+SAMPLER_STREAMS = {"A3": 0, "D1": 1, "D2": 2, "D3": 3, "D4": 4}
+#columns of a descriptor CSV written by write_to_csv
+CSV_HEADER = ['name', 'class', 'surfaceAreaObj', 'compactnessObj', 'rectangularityObj', 'diameterObj', 'convexityObj', 'eccentricityObj', 'A3', 'D1', 'D2', 'D3', 'D4', 'seed', 'samplerVersion']
+
+def farthest_pair_distance(points, block_size=1024):
+    #lower bound: the point farthest from the centroid and its own farthest point
+    center = np.mean(points, axis=0)
+    radii = np.linalg.norm(points - center, axis=1)
+    farthest = np.argmax(radii)
+    distances = np.linalg.norm(points - points[farthest], axis=1)
+    best_pair = (farthest, np.argmax(distances))
+    best_distance = distances[best_pair[1]]
+    #a pair can only beat the lower bound if r_i + r_j does, so drop every point with r_i + max(r) below it
+    candidates = np.flatnonzero(radii + radii.max() >= best_distance)
+    candidate_points = points[candidates]
+    squared_norms = np.einsum('ij,ij->i', candidate_points, candidate_points)
+    best_squared = best_distance ** 2
+    #blocked upper triangle of the pairwise squared distance matrix
+    for start in range(0, len(candidates), block_size):
+        stop = min(start + block_size, len(candidates))
+        block = candidate_points[start:stop]
+        squared = squared_norms[start:stop, None] + squared_norms[None, start:] - 2 * block @ candidate_points[start:].T
+        row, col = np.unravel_index(np.argmax(squared), squared.shape)
+        if squared[row, col] > best_squared:
+            best_squared = squared[row, col]
+            best_pair = (candidates[start + row], candidates[start + col])
+    #recompute the winner directly to avoid the rounding of the expanded formula
+    return np.linalg.norm(points[best_pair[0]] - points[best_pair[1]])
+
+class GeometryContext:
+    #lazily computed geometry shared by every descriptor, so the hull and eigendecomposition are only done once per mesh
+    def __init__(self, vertices, faces):
+        self.vertices = vertices
+        self.faces = faces
+
+    @cached_property
+    def face_cross_products(self):
+        #(v1 - v0) x (v2 - v0) for every triangle at once
+        v0, v1, v2 = (self.vertices[self.faces[:, i]] for i in range(3))
+        return np.cross(v1 - v0, v2 - v0)
+
+    @cached_property
+    def face_areas(self):
+        return np.linalg.norm(self.face_cross_products, axis=1) / 2
+
+    @cached_property
+    def surface_area(self):
+        return np.sum(self.face_areas)
+
+    @cached_property
+    def signed_volume(self):
+        #sum of the signed tetrahedron volumes v0 . (v1 x v2) / 6, which equals v0 . ((v1 - v0) x (v2 - v0)) / 6
+        v0 = self.vertices[self.faces[:, 0]]
+        return np.einsum('ij,ij->', v0, self.face_cross_products) / 6.0
+
+    @cached_property
+    def hull(self):
+        return ConvexHull(self.vertices)
+
+    @cached_property
+    def mean(self):
+        return np.mean(self.vertices, axis=0)
+
+    @cached_property
+    def centered_vertices(self):
+        return self.vertices - self.mean
+
+    @cached_property
+    def covariance(self):
+        return np.cov(self.centered_vertices, rowvar=False)
+
+    @cached_property
+    def eigenbasis(self):
+        #eigenvalues in ascending order, eigenvectors as columns
+        return np.linalg.eigh(self.covariance)
 
 class ObjectCalculations:
-    def __init__(self, obj_file):
+    def __init__(self, obj_file, seed=None, *, executor=None):
         self.obj_file = obj_file
-        self.vertices, self.faces, self.SurfaceArea, self.volume, self.barycenter = self.load_obj(obj_file)
+        self.vertices, self.faces = self.load_obj(obj_file)
+        self.geometry = GeometryContext(self.vertices, self.faces)
+        self.SurfaceArea = self.geometry.surface_area
+        self.volume = abs(self.geometry.signed_volume)
+        self.barycenter = self.geometry.mean
+        #same mesh content --> same seed --> same histograms
+        self.seed = self.content_seed() if seed is None else seed
+        self.sampler_version = SAMPLER_VERSION
         self.convex_hull_volume = self.calculate_convex_hull_volume()
         self.eigenvalues = self.calculate_eigenvalues()
         self.obb_volume = self.calculate_obb_volume()
@@ -20,7 +107,7 @@ class ObjectCalculations:
         self.diameterObj = self.diameter()
         self.convexityObj = self.convexity()
         self.eccentricityObj = self.eccentricity()
-        self.A3, self.D1, self.D2, self.D3, self.D4 = self.compute_all_histograms()
+        self.A3, self.D1, self.D2, self.D3, self.D4 = self.compute_all_histograms(executor)
         self.single_val_features = ["surfaceAreaObj","compactnessObj","rectangularityObj","diameterObj","convexityObj","eccentricityObj"]
         self.hist_features = ["A3","D1","D2","D3","D4"]
         
@@ -44,7 +131,7 @@ class ObjectCalculations:
         }
         return descriptors
 
-    def normalizeFeatures(self):
+    def normalizeFeatures(self, standardization=None):
         # get features of preprocessed search object
         self.features = self.get_descriptors()
         
@@ -52,8 +139,10 @@ class ObjectCalculations:
         del self.features['eigenvalues']
         del self.features['obb_volume']
 
-        # load values to standardize with
-        df_features_means_stds = pd.read_csv("MultimediaRetrieval\steps\AxelHoekje\searchStandardizationData.csv")
+        # load values to standardize with (a SearchEngine passes the ones it already loaded)
+        df_features_means_stds = standardization
+        if df_features_means_stds is None:
+            df_features_means_stds = pd.read_csv("MultimediaRetrieval\steps\AxelHoekje\searchStandardizationData.csv")
 
         # standardize single-value features (hist features already done)
         for single_val_feature in self.single_val_features:
@@ -85,7 +174,8 @@ class ObjectCalculations:
     def getGlobalDescriptors(self):
         return self.A3, self.D1, self.D2, self.D3, self.D4
 
-    def write_to_csv(self):
+    def to_row(self):
+        #one database CSV row, so a pool can hand rows back to one writer
         #get the last part
         last_part = os.path.basename(self.obj_file)
     
@@ -98,38 +188,38 @@ class ObjectCalculations:
         D3_str = ','.join(map(str, self.D3))
         D4_str = ','.join(map(str, self.D4))
         
-        data = [
-            last_part, second_to_last_part, self.surfaceAreaObj, self.compactnessObj, self.rectangularityObj, self.diameterObj, self.convexityObj, self.eccentricityObj, A3_str, D1_str, D2_str, D3_str, D4_str
+        return [
+            last_part, second_to_last_part, self.surfaceAreaObj, self.compactnessObj, self.rectangularityObj, self.diameterObj, self.convexityObj, self.eccentricityObj, A3_str, D1_str, D2_str, D3_str, D4_str, self.seed, self.sampler_version
         ]
-        file_path = 'C:/Users/axelv/OneDrive/Desktop/MediaRetrieval/MultimediaRetrieval/steps/AxelHoekje/testingtest.csv'
-        #check if the file exists to write headers
-        file_exists = os.path.isfile(file_path)    
+
+    def write_to_csv(self, file_path='C:/Users/axelv/OneDrive/Desktop/MediaRetrieval/MultimediaRetrieval/steps/AxelHoekje/testingtest.csv'):
+        #only append to a file with the same columns, an older CSV (without seed/samplerVersion) would get ragged rows
+        file_exists = os.path.isfile(file_path) and os.path.getsize(file_path) > 0
+        if file_exists:
+            with open(file_path, mode='r', newline='') as file:
+                header = next(csv.reader(file), [])
+            if header != CSV_HEADER:
+                new_file_path = os.path.splitext(file_path)[0] + f"_samplerV{SAMPLER_VERSION}.csv"
+                print(f"[Warning] descriptors: {file_path} has other columns, writing to {new_file_path} instead")
+                file_path = new_file_path
+                file_exists = os.path.isfile(file_path) and os.path.getsize(file_path) > 0
         with open(file_path, mode='a', newline='') as file:
             writer = csv.writer(file)
             if not file_exists:
-                writer.writerow(['name', 'class', 'surfaceAreaObj', 'compactnessObj', 'rectangularityObj', 'diameterObj', 'convexityObj', 'eccentricityObj', 'A3', 'D1', 'D2', 'D3', 'D4'])
-            writer.writerow(data)
+                writer.writerow(CSV_HEADER)
+            writer.writerow(self.to_row())
 
     def load_obj(self, obj_file):
-        vertices = []
-        faces = []
-        SurfaceArea = 0.0
-        volume = 0.0
-        with open(obj_file, 'r') as file:
-            for line in file:
-                if line.startswith('v '):
-                    vertices.append(list(map(float, line.strip().split()[1:])))
-                elif line.startswith('f '):
-                    face = [int(idx.split('/')[0]) - 1 for idx in line.strip().split()[1:]]
-                    faces.append(face)
-                    #calculate surface area and volume contribution of this face
-                    v0, v1, v2 = [vertices[idx] for idx in face]
-                    #surface area calculation
-                    triangle_area = np.linalg.norm(np.cross(np.array(v1) - np.array(v0), np.array(v2) - np.array(v0))) / 2
-                    SurfaceArea += triangle_area
-                    #volume calculation using the signed volume of the tetrahedron
-                    volume += np.dot(v0, np.cross(v1, v2)) / 6.0
-        return np.array(vertices), np.array(faces), SurfaceArea, abs(volume), np.mean(vertices, axis=0)
+        #only parse here, the area and volume are computed in one batched pass by GeometryContext
+        vertices, faces = load_mesh(obj_file, stage="normalized")
+        return vertices.astype(np.float64), faces.astype(np.int64)
+
+    def content_seed(self):
+        #hash the parsed mesh so the seed does not depend on the file path or formatting
+        mesh_hash = hashlib.sha1()
+        mesh_hash.update(np.ascontiguousarray(self.vertices, dtype=np.float64).tobytes())
+        mesh_hash.update(np.ascontiguousarray(self.faces, dtype=np.int64).tobytes())
+        return int(mesh_hash.hexdigest()[:16], 16)
 
     def calcSurfaceArea(self):
         return float(f"{self.SurfaceArea:.5f}")
@@ -141,29 +231,19 @@ class ObjectCalculations:
         return float(f"{compactness:.5f}")
 
     def calculate_convex_hull_volume(self):
-        hull = ConvexHull(self.vertices)
-        return hull.volume
+        return self.geometry.hull.volume
 
     def calculate_eigenvalues(self):
-        cov_matrix = np.cov(self.vertices.T)
-        eigenvalues, _ = np.linalg.eig(cov_matrix)
+        eigenvalues, _ = self.geometry.eigenbasis
         return eigenvalues
 
     def rectangularity(self):
         return float(f"{self.volume / self.obb_volume:.5f}")
 
     def diameter(self):
-        hull = ConvexHull(self.vertices)
-        hull_vertices = self.vertices[hull.vertices]
-        #find the maximum distance between any pair of hull vertices
-        max_distance = 0
-        num_hull_vertices = len(hull_vertices)
-        for i in range(num_hull_vertices):
-            for j in range(i + 1, num_hull_vertices):
-                distance = np.linalg.norm(hull_vertices[i] - hull_vertices[j])
-                if distance > max_distance:
-                    max_distance = distance        
-        return float(f"{max_distance:.5f}")
+        #the farthest pair always lies on the convex hull, so reuse the one from calculate_convex_hull_volume
+        hull_vertices = self.vertices[self.geometry.hull.vertices]
+        return float(f"{farthest_pair_distance(hull_vertices):.5f}")
 
     def convexity(self):
         return float(f"{self.volume / self.convex_hull_volume :.5f}")
@@ -172,14 +252,10 @@ class ObjectCalculations:
         return float(f"{(max(self.eigenvalues) / min(self.eigenvalues)):.5f}")
     
     def calculate_obb_volume(self):
-        #step 1: Compute the covariance matrix
-        mean = np.mean(self.vertices, axis=0)
-        centered_points = self.vertices - mean
-        covariance_matrix = np.cov(centered_points, rowvar=False)       
-        #step 2: Eigen decomposition
-        eigenvalues, eigenvectors = np.linalg.eigh(covariance_matrix)        
+        #step 1 and 2: covariance matrix and eigen decomposition come from the shared geometry
+        _, eigenvectors = self.geometry.eigenbasis
         #step 3: Rotate the points to align with the principal axes
-        rotated_points = np.dot(centered_points, eigenvectors)        
+        rotated_points = np.dot(self.geometry.centered_vertices, eigenvectors)        
         #step 4: Find the extents
         min_extents = np.min(rotated_points, axis=0)
         max_extents = np.max(rotated_points, axis=0)        
@@ -188,95 +264,65 @@ class ObjectCalculations:
         obb_volume = np.prod(obb_extents) 
         return obb_volume
     
-    def calculate_angle(self, v1, v2, v3):
-        #calculate vectors
-        vec1 = v2 - v1
-        vec2 = v3 - v1        
-        #calculate the magnitudes of the vectors
-        norm_vec1 = np.linalg.norm(vec1)
-        norm_vec2 = np.linalg.norm(vec2)    
-        #check for zero magnitude to avoid division by zero
-        if norm_vec1 == 0 or norm_vec2 == 0:
-            return 0.0  # or some other default value or handling       
-        #calculate the cosine of the angle using dot product
-        cos_angle = np.dot(vec1, vec2) / (norm_vec1 * norm_vec2)        
-        #ensure the cosine value is within the valid range [-1, 1]
-        cos_angle = np.clip(cos_angle, -1.0, 1.0)        
-        #calculate the angle in radians and then convert to degrees
-        angle = np.arccos(cos_angle)
-        angle_degrees = np.degrees(angle)        
-        return angle_degrees
+    def sample_vertex_tuples(self, num_samples, tuple_size, feature):
+        #draw all index tuples at once and reject the ones that reuse a vertex (random.sample picks distinct vertices)
+        rng = np.random.default_rng([self.seed, SAMPLER_STREAMS[feature]])
+        num_vertices = len(self.vertices)
+        if num_vertices < tuple_size:
+            #no tuple of distinct vertices exists, the rejection loop below would never end (random.sample raised here)
+            raise ValueError(f"{feature} needs {tuple_size} distinct vertices, {self.obj_file} has {num_vertices}")
+        samples = np.empty((0, tuple_size), dtype=np.int64)
+        while len(samples) < num_samples:
+            missing = num_samples - len(samples)
+            candidates = rng.integers(0, num_vertices, size=(missing + missing // 4 + 16, tuple_size))
+            sorted_candidates = np.sort(candidates, axis=1)
+            distinct = np.all(sorted_candidates[:, 1:] != sorted_candidates[:, :-1], axis=1)
+            samples = np.concatenate([samples, candidates[distinct][:missing]])
+        #one (num_samples, 3) array of coordinates per tuple position
+        return [self.vertices[samples[:, i]] for i in range(tuple_size)]
 
     def compute_A3(self, num_samples):
-        angles = []
-        for _ in range(num_samples):
-            #randomly select three distinct vertices
-            v1, v2, v3 = random.sample(list(self.vertices), 3)
-            #calculate the angle between the three vertices
-            angle = self.calculate_angle(np.array(v1), np.array(v2), np.array(v3))
-            angles.append(angle)
-        return angles
+        v1, v2, v3 = self.sample_vertex_tuples(num_samples, 3, "A3")
+        vec1 = v2 - v1
+        vec2 = v3 - v1
+        norms = np.linalg.norm(vec1, axis=1) * np.linalg.norm(vec2, axis=1)
+        #zero magnitude vectors get an angle of 0 to avoid division by zero
+        valid = norms > 0
+        cos_angles = np.ones(num_samples)
+        cos_angles[valid] = np.einsum('ij,ij->i', vec1[valid], vec2[valid]) / norms[valid]
+        cos_angles = np.clip(cos_angles, -1.0, 1.0)
+        return np.degrees(np.arccos(cos_angles))
 
     def compute_D1(self, num_samples):
-        barycenter = self.barycenter
-        distances = []
         print('Started D1')
-        for  v in self.vertices:
-            distance = np.linalg.norm(barycenter - v)
-            distances.append(distance)    
-        return distances
+        return np.linalg.norm(self.vertices - self.barycenter, axis=1)
     
     def compute_D2(self, num_samples):
-        distances = []
-        for _ in range(num_samples):
-            v1, v2 = random.sample(list(self.vertices), 2)
-            distance = np.linalg.norm(np.array(v1) - np.array(v2))
-            distances.append(distance)      
-        return distances
-    
-    def calculate_triangle_area(self, v1, v2, v3):
-        vec1 = np.array(v2) - np.array(v1)
-        vec2 = np.array(v3) - np.array(v1)
-        cross_product = np.cross(vec1, vec2)
-        area = np.linalg.norm(cross_product) / 2
-        return area
+        v1, v2 = self.sample_vertex_tuples(num_samples, 2, "D2")
+        return np.linalg.norm(v1 - v2, axis=1)
 
     def compute_D3(self, num_samples):
-        areas = []
-        for _ in range(num_samples):
-            v1, v2, v3 = random.sample(list(self.vertices), 3)            
-            area = self.calculate_triangle_area(v1, v2, v3)
-            areas.append(np.sqrt(area))
-        return areas
-    
-    def calculate_tetrahedron_volume(self, v1, v2, v3, v4):
-        #calculate the volume of the tetrahedron using the determinant
-        matrix = np.array([v2 - v1, v3 - v1, v4 - v1])
-        volume = np.abs(np.linalg.det(matrix)) / 6
-        return volume
+        v1, v2, v3 = self.sample_vertex_tuples(num_samples, 3, "D3")
+        areas = np.linalg.norm(np.cross(v2 - v1, v3 - v1), axis=1) / 2
+        return np.sqrt(areas)
 
     def compute_D4(self, num_samples):
-        volumes = []     
-        for _ in range(num_samples):
-            v1, v2, v3, v4 = random.sample(list(self.vertices), 4)           
-            volume = self.calculate_tetrahedron_volume(v1, v2, v3, v4)
-            volumes.append(np.cbrt(volume))        
-
-            
-        return volumes
+        v1, v2, v3, v4 = self.sample_vertex_tuples(num_samples, 4, "D4")
+        #scalar triple product equals the determinant of [v2 - v1, v3 - v1, v4 - v1]
+        volumes = np.abs(np.einsum('ij,ij->i', v2 - v1, np.cross(v3 - v1, v4 - v1))) / 6
+        return np.cbrt(volumes)
 
-    def compute_all_histograms(self):
+    def compute_all_histograms(self, executor=None):
+        #the kernels are vectorized, so one process is fast enough (a pool per shape cost more to start than it saved)
+        #executor: optional concurrent.futures executor shared by the caller, e.g. a ThreadPoolExecutor (numpy releases the GIL)
+        #dataset builds parallelize across shapes instead (buildDatabase.py)
         N = 100000
         numberBins = 93
-        with multiprocessing.Pool(processes=5) as pool:
-            results = pool.starmap(self.compute_histogram, [
-                (self.compute_A3, N, numberBins),
-                (self.compute_D1, N, numberBins),
-                (self.compute_D2, N, numberBins),
-                (self.compute_D3, N, numberBins),
-                (self.compute_D4, N, numberBins)
-            ])
-        return results
+        descriptor_funcs = [self.compute_A3, self.compute_D1, self.compute_D2, self.compute_D3, self.compute_D4]
+        if executor is None:
+            return [self.compute_histogram(descriptor_func, N, numberBins) for descriptor_func in descriptor_funcs]
+        futures = [executor.submit(self.compute_histogram, descriptor_func, N, numberBins) for descriptor_func in descriptor_funcs]
+        return [future.result() for future in futures]
 
     def compute_histogram(self, descriptor_func, num_samples, num_bins):
         values = descriptor_func(num_samples)
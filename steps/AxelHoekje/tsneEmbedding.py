@@ -0,0 +1,74 @@
+import os
+import sys
+import glob
+import threading
+import numpy as np
+from sklearn.manifold import TSNE
+
+from indexCache import features_hash
+from descriptorStore import load_descriptor_store, store_paths
+
+############################################################################################
+# 2-D t-SNE embedding of a descriptor database, computed once per database version
+############################################################################################
+# <base>.tsne_<database hash>.npy --> N x 2 float32, saved next to the descriptor store
+# a search only highlights its shape in this embedding instead of running t-SNE again
+
+def compute_embedding(features):
+    params = dict(n_components=2, perplexity=30, random_state=42)
+    try:
+        tsne = TSNE(max_iter=1000, **params)
+    except TypeError:
+        # scikit-learn before 1.5 calls it n_iter
+        tsne = TSNE(n_iter=1000, **params)
+    return tsne.fit_transform(features)
+
+def embedding_path(csv_filepath, features):
+    base_path = os.path.splitext(store_paths(csv_filepath)[0])[0]
+    return f"{base_path}.tsne_{features_hash(features)}.npy"
+
+def load_embedding(csv_filepath, features):
+    """The saved embedding of exactly these features, or None when it has not been computed yet."""
+    path = embedding_path(csv_filepath, features)
+    if os.path.exists(path):
+        return np.load(path)
+    return None
+
+def load_or_compute_embedding(csv_filepath, features):
+    embedding = load_embedding(csv_filepath, features)
+    if embedding is not None:
+        return embedding
+
+    print(f"[Info] t-SNE: computing the embedding of {len(features)} shapes, this only happens once per database")
+    embedding = compute_embedding(np.asarray(features, dtype=np.float32)).astype(np.float32)
+    path = embedding_path(csv_filepath, features)
+    base_path = os.path.splitext(store_paths(csv_filepath)[0])[0]
+    for stale_path in glob.glob(f"{base_path}.tsne_*.npy"):
+        os.remove(stale_path)
+    np.save(path + ".tmp.npy", embedding)
+    os.replace(path + ".tmp.npy", path)
+    print(f"[Finished] t-SNE: saved {path}")
+    return embedding
+
+class BackgroundEmbedding:
+    """Loads (or computes) the embedding in a thread, so searches never wait for t-SNE."""
+    def __init__(self, csv_filepath, features):
+        self.embedding = None
+        self.thread = threading.Thread(target=self.run, args=(csv_filepath, features), daemon=True)
+        self.thread.start()
+
+    def run(self, csv_filepath, features):
+        self.embedding = load_or_compute_embedding(csv_filepath, features)
+
+    def ready(self):
+        return self.embedding is not None
+
+    def wait(self):
+        self.thread.join()
+        return self.embedding
+
+if __name__ == "__main__":
+    # precompute after (re)building a database: python tsneEmbedding.py dataBaseNormalised.csv dataBaseFinal.csv
+    for csv_filepath in sys.argv[1:]:
+        store = load_descriptor_store(csv_filepath)
+        load_or_compute_embedding(csv_filepath, store.matrix)
@@ -1,30 +1,23 @@
 import os
+import sys
 import numpy as np
 import pandas as pd
 
+# the shared OBJ reader lives with the final application
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "AxelHoekje"))
+from meshReader import read_obj_polygons
+
 ############################################################################################
 # Load object file (from step1, but modified to test for quads, triangles, mixed)
 ############################################################################################
 def load_obj(filename):
     faceType = "triangles"
-    quads = False
-    triangles = False
-
-    vertices = []
-    faces = []
-    with open(filename, 'r') as f:
-        for line in f:
-            if line.startswith('v '):
-                vertices.append(list(map(float, line.strip().split()[1:])))
-            elif line.startswith('f '):
-                face = [int(val.split('/')[0]) - 1 for val in line.strip().split()[1:]]
-                faces.append(face)
-                
-                # check for triangles or quads
-                if len(face) == 3:
-                    triangles = True
-                elif len(face) == 4:
-                    quads = True
+
+    vertices, indices, sizes = read_obj_polygons(filename)
+
+    # check for triangles or quads
+    triangles = bool(np.any(sizes == 3))
+    quads = bool(np.any(sizes == 4))
 
     # set faceType
     if triangles and quads:
@@ -32,7 +25,13 @@ def load_obj(filename):
     elif quads:
         faceType = "quads"
 
-    return np.array(vertices, dtype=np.float32), np.array(faces, dtype=np.int32), faceType
+    # one row per face when all faces have the same size, otherwise a list of faces like before
+    if len(sizes) == 0 or np.all(sizes == sizes[0]):
+        faces = indices.reshape(len(sizes), -1) if len(sizes) else indices.reshape(0, 3)
+    else:
+        faces = np.split(indices, np.cumsum(sizes)[:-1])
+
+    return vertices, faces, faceType
 # print(load_obj("ShapeDatabase_INFOMR-master/AircraftBuoyant/m1337.obj"))
 
 ############################################################################################
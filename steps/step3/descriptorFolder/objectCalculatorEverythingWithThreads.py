@@ -6,6 +6,9 @@ import multiprocessing
 from scipy.spatial import ConvexHull
 from math import pi
 
+CSV_FILE = r'MultimediaRetrieval\steps\step3\descriptorFolder\descriptorsResampledNormalisedData.csv'
+CSV_HEADER = ['name', 'class', 'surfaceAreaObj', 'compactnessObj', 'rectangularityObj', 'diameterObj', 'convexityObj', 'eccentricityObj', 'A3', 'D1', 'D2', 'D3', 'D4']
+
 class ObjectCalculations:
     def __init__(self, obj_file):
         self.obj_file = obj_file
@@ -30,8 +33,8 @@ class ObjectCalculations:
         self.D4 = self.compute_histogram(self.compute_D4, N, numberBins)
         
         
-    def write_to_csv(self):
-        # Summarize the lists by taking their mean
+    def to_row(self):
+        # one CSV row: name, class, the single values and the histograms as comma separated strings
         last_part = os.path.basename(self.obj_file)
     
         # Get the part before the last part (directory name)
@@ -43,10 +46,11 @@ class ObjectCalculations:
         D3_str = ','.join(map(str, self.D3))
         D4_str = ','.join(map(str, self.D4))
         
-        data = [
+        return [
             last_part, second_to_last_part, self.surfaceAreaObj, self.compactnessObj, self.rectangularityObj, self.diameterObj, self.convexityObj, self.eccentricityObj, A3_str, D1_str, D2_str, D3_str, D4_str
         ]
-        file_path = 'MultimediaRetrieval\steps\step3\descriptorFolder\descriptorsResampledNormalisedData.csv'
+
+    def write_to_csv(self, file_path=CSV_FILE):
         # Check if the file exists to write headers
         file_exists = os.path.isfile(file_path)    
         # Open the file in append mode
@@ -54,9 +58,9 @@ class ObjectCalculations:
             writer = csv.writer(file)
             # Write the headers if the file is new
             if not file_exists:
-                writer.writerow(['name', 'class', 'surfaceAreaObj', 'compactnessObj', 'rectangularityObj', 'diameterObj', 'convexityObj', 'eccentricityObj', 'A3', 'D1', 'D2', 'D3', 'D4'])
+                writer.writerow(CSV_HEADER)
             # Write the data as a new row
-            writer.writerow(data)
+            writer.writerow(self.to_row())
 
     def load_obj(self, obj_file):
         vertices = []
@@ -240,12 +244,28 @@ def process_file(obj_file_path):
     obj_file_path = os.path.normpath(obj_file_path)  # Normalize the path
     print(f"Processing file: {obj_file_path}")
     #Create an instance of ObjectCalculations for each OBJ file
-    obj_calc = ObjectCalculations(obj_file_path)
-    # Write the descriptors to the CSV file
-    obj_calc.write_to_csv()
+    try:
+        obj_calc = ObjectCalculations(obj_file_path)
+    except Exception as error:
+        print(f"[Warning] descriptors: {obj_file_path} failed ({error}), it is left out")
+        return None
+    # the worker only returns the row, the parent process does all the writing
+    return obj_calc.to_row()
+
+def write_rows(rows, file_path=CSV_FILE, overwrite=False):
+    """Appends the rows (in the order they come, None = failed shape) to the CSV with one writer,
+    the header only goes into a new or empty file. overwrite=True starts the file over."""
+    rows = [row for row in rows if row is not None]
+    file_exists = not overwrite and os.path.isfile(file_path) and os.path.getsize(file_path) > 0
+    with open(file_path, mode='a' if file_exists else 'w', newline='') as file:
+        writer = csv.writer(file)
+        if not file_exists:
+            writer.writerow(CSV_HEADER)
+        writer.writerows(rows)
+    return len(rows)
 
 if __name__ == "__main__":
-    def process_folder(folder_path):
+    def process_folder(folder_path, file_path=CSV_FILE, overwrite=False):
         # List to hold all .obj file paths
         obj_files = []
 
@@ -254,11 +274,14 @@ if __name__ == "__main__":
             for file in files:
                 if file.endswith('.obj'):
                     obj_files.append(os.path.join(root, file))
+        # sorted, so the rows always end up in the same order
+        obj_files.sort()
 
-        # Create a pool of worker threads
+        # Create a pool of worker processes, imap hands the rows back in input order while the workers keep going
         with multiprocessing.Pool() as pool:
-            pool.map(process_file, obj_files)
+            written = write_rows(pool.imap(process_file, obj_files, chunksize=4), file_path, overwrite)
+        print(f"[Finished] descriptors: {written}/{len(obj_files)} shapes --> {file_path}")
 
     # Remove #s to do all the normalized shapes
     folder_path = 'MultimediaRetrieval/NormalizedShapes-resampledPart'
-    process_folder(folder_path)
\ No newline at end of file
+    process_folder(folder_path)
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+# the search engines live with the final application
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "AxelHoekje"))
+from descriptorStore import load_descriptor_store
+from indexBackends import FaissIndex, index_from_config, load_ann_config, config_vector_builder
+from simpleSearch import search_many
+from retrievalEvaluation import drop_self, evaluate_curves, RECALL_LEVELS
+
+############################################################################################
+# Simple search, exact KNN and ANN compared on one leave-one-out run
+############################################################################################
+# every engine ranks the database once per query (up to k_max, the whole database by default) and all
+# curves/metrics come from that single ranking: PR curve, R-precision, mAP and AUC per class
+
+DATABASE_CSV = r'MultimediaRetrieval\steps\AxelHoekje\dataBaseFinal.csv'
+NORMALISED_DATABASE_CSV = r'MultimediaRetrieval\steps\AxelHoekje\dataBaseNormalised.csv'
+OUTPUT_FOLDER = r'MultimediaRetrieval\steps\step6'
+
+def faiss_ranking(index, features, k_max):
+    index.build_index(features)
+    _, found = index.search(features, k_max + 1)
+    return drop_self(found)
+
+def rankings(k_max=None):
+    store = load_descriptor_store(DATABASE_CSV)
+    normalised_store = load_descriptor_store(NORMALISED_DATABASE_CSV)
+    k_max = min(k_max or len(store) - 1, len(store) - 1)
+    features = np.asarray(normalised_store.matrix, dtype=np.float32)
+    # the ANN as the application runs it: on the vectors of the builder annConfig.json was tuned with
+    ann_config = load_ann_config()
+    ann_vectors = config_vector_builder(ann_config).build(features)
+
+    engines = {
+        "simple search": (lambda: drop_self(search_many(store.matrix, store, k=k_max + 1)[0]), store.classes),
+        "exact KNN": (lambda: faiss_ranking(FaissIndex(features.shape[1], "Flat"), features, k_max), normalised_store.classes),
+        "ANN": (lambda: faiss_ranking(index_from_config(ann_vectors.shape[1], ann_config), ann_vectors, k_max), normalised_store.classes),
+    }
+    for name, (rank, classes) in engines.items():
+        start = time.perf_counter()
+        ranking = rank()
+        print(f"[Info] {name}: ranked {len(ranking)} queries up to k={k_max} in {time.perf_counter() - start:.2f}s")
+        yield name, ranking, classes
+
+def compare(k_max=None, plot=True):
+    summaries, class_tables, curves = {}, [], {}
+    for name, ranking, classes in rankings(k_max):
+        summary, per_class, curve = evaluate_curves(ranking, classes)
+        summaries[name] = summary
+        curves[name] = curve
+        class_tables.append(per_class[["class", "shapes", "AUC"]].rename(columns={"AUC": name}).set_index(["class", "shapes"]))
+
+    summary_table = pd.DataFrame(summaries).T
+    auc_table = pd.concat(class_tables, axis=1).reset_index()
+    print(summary_table.to_string(float_format="%.4f"))
+    print(auc_table.to_string(float_format="%.4f"))
+    auc_table.to_csv(os.path.join(OUTPUT_FOLDER, "engineComparisonAUC.csv"), index=False)
+    print(f"[Finished] comparison: per-class AUC table saved to {os.path.join(OUTPUT_FOLDER, 'engineComparisonAUC.csv')}")
+
+    if plot:
+        plt.figure(figsize=(8, 6))
+        for name, curve in curves.items():
+            plt.plot(RECALL_LEVELS, curve, marker='o', label=f"{name} (AUC={summaries[name]['AUC']:.3f})")
+        plt.title("Interpolated precision-recall, leave-one-out", fontsize=16)
+        plt.xlabel('Recall', fontsize=12)
+        plt.ylabel('Precision', fontsize=12)
+        plt.legend()
+        plt.grid(True)
+        plt.tight_layout()
+        plt.savefig(os.path.join(OUTPUT_FOLDER, "engineComparisonPR.png"))
+        plt.show()
+    return summary_table, auc_table
+
+if __name__ == "__main__":
+    # python compareEngines.py [k_max]
+    compare(int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -1,114 +1,42 @@
 import os
-import pandas as pd
-import numpy as np
-import faiss
+import sys
+import time
 
-# Parse descriptor columns
-def parseDescriptorColumns(df):
-    for col in ['A3', 'D1', 'D2', 'D3', 'D4']:
-        df[col] = df[col].apply(lambda x: np.fromstring(x, sep=','))
-    feature_matrix = np.hstack([    
-        df['surfaceAreaObj'].values.reshape(-1, 1),
-        df['compactnessObj'].values.reshape(-1, 1),
-        df['rectangularityObj'].values.reshape(-1, 1),
-        df['diameterObj'].values.reshape(-1, 1),
-        df['convexityObj'].values.reshape(-1, 1),
-        df['eccentricityObj'].values.reshape(-1, 1),
-        np.vstack(df['A3'].values),
-        np.vstack(df['D1'].values),
-        np.vstack(df['D2'].values),
-        np.vstack(df['D3'].values),
-        np.vstack(df['D4'].values)
-    ])
-    return feature_matrix
+# the shared index interface and descriptor store live with the final application
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "AxelHoekje"))
+from descriptorStore import load_descriptor_store
+from indexBackends import FaissIndex
+from retrievalEvaluation import leave_one_out_ranking, evaluate_ranking
 
-# Load descriptors with parsed columns
-def loadDescriptors(csv_filepath):
-    if os.path.exists(csv_filepath):
-        print("File found! Loading...")
-        df = pd.read_csv(csv_filepath)
-        feature_matrix = parseDescriptorColumns(df)
-        return df, feature_matrix
-    else:
-        print(f"File not found at: {csv_filepath}")
-        return None, None
-
-# KNN Engine
-class KNNEvaluationEngine:
-    def __init__(self, feature_dim):
-        self.feature_dim = feature_dim
-        self.index = faiss.IndexFlatL2(self.feature_dim)  # Initialize FAISS with L2 (Euclidean) distance
-
-    def buildIndex(self, features):
-        features = np.ascontiguousarray(features, dtype=np.float32)  # Ensure correct format
-        self.index.add(features)  # Add features to the FAISS index
-
-    def query(self, query_vector, k=7):
-        query_vector = np.ascontiguousarray(query_vector.reshape(1, -1), dtype=np.float32)
-        distances, indices = self.index.search(query_vector, k + 1)  # Search for k+1 neighbors to exclude self
-        indices, distances = indices[0][1:k+1], distances[0][1:k+1]  # Exclude the query shape itself
-        return indices, distances
-
-# Calculate precision and recall
+# Calculate precision and recall: every shape is a query, all of them in one batched search
 def calculatePrecisionRecall(df, knn_engine, feature_matrix, k=7):
-    correct_matches = 0
-    total_relevant = 0
-    total_retrieved = 0
-    precision_per_class = {}
-    recall_per_class = {}
-
-    for idx, query_shape in df.iterrows():
-        query_vector = feature_matrix[idx]
-        query_class = query_shape['class']
-        
-        # Retrieve k-nearest neighbors using FAISS
-        neighbors, _ = knn_engine.query(query_vector, k=k)
-
-        # Calculate true positives
-        relevant_retrieved = sum(1 for neighbor_idx in neighbors if df.iloc[neighbor_idx]['class'] == query_class)
-        total_relevant += sum(1 for _ in df[df['class'] == query_class].index)
-        correct_matches += relevant_retrieved
-        total_retrieved += k
-
-        # Precision and Recall per class
-        if query_class not in precision_per_class:
-            precision_per_class[query_class] = []
-            recall_per_class[query_class] = []
-        
-        precision = relevant_retrieved / k if k > 0 else 0
-        recall = relevant_retrieved / total_relevant if total_relevant > 0 else 0
-
-        precision_per_class[query_class].append(precision)
-        recall_per_class[query_class].append(recall)
-
-    # Calculate aggregate precision and recall for each class
-    avg_precision_per_class = {cls: np.mean(precisions) for cls, precisions in precision_per_class.items()}
-    avg_recall_per_class = {cls: np.mean(recalls) for cls, recalls in recall_per_class.items()}
-
-    # Show overall precision and recall
-    overall_precision = correct_matches / total_retrieved if total_retrieved > 0 else 0
-    overall_recall = correct_matches / total_relevant if total_relevant > 0 else 0
+    ranking = leave_one_out_ranking(knn_engine, feature_matrix, k)
+    summary, per_class = evaluate_ranking(ranking, df['class'].to_numpy())
 
-    return avg_precision_per_class, avg_recall_per_class, overall_precision, overall_recall
+    avg_precision_per_class = dict(zip(per_class['class'], per_class['precision']))
+    avg_recall_per_class = dict(zip(per_class['class'], per_class['recall']))
+    return avg_precision_per_class, avg_recall_per_class, summary[f"precision@{k}"], summary[f"recall@{k}"], summary
 
 def main():
     csv_filepath = r'MultimediaRetrieval\steps\AxelHoekje\dataBaseNormalised.csv'
 
     # Load the descriptors
-    df, feature_matrix = loadDescriptors(csv_filepath)
-    if df is None or feature_matrix is None:
+    store = load_descriptor_store(csv_filepath)
+    if store is None:
         print("Failed to load descriptors. Exiting.")
         return
+    df, feature_matrix = store.to_frame(), store.matrix
 
     # Initialize and build the FAISS index
-    knn_engine = KNNEvaluationEngine(feature_dim=feature_matrix.shape[1])
-    knn_engine.buildIndex(feature_matrix)
+    knn_engine = FaissIndex(feature_matrix.shape[1], "Flat")
+    knn_engine.build_index(feature_matrix)
 
     # Set K for KNN
     k = 5
 
     # Calculate precision and recall
-    avg_precision_per_class, avg_recall_per_class, overall_precision, overall_recall = calculatePrecisionRecall(df, knn_engine, feature_matrix, k=k)
+    start = time.perf_counter()
+    avg_precision_per_class, avg_recall_per_class, overall_precision, overall_recall, summary = calculatePrecisionRecall(df, knn_engine, feature_matrix, k=k)
 
     # Show the results in terminal 
     print("Average Precision per Class:")
@@ -121,6 +49,9 @@ def main():
     
     print(f"\nOverall Precision: {overall_precision:.2f}")
     print(f"Overall Recall: {overall_recall:.2f}")
+    print(f"Overall mAP@{k}: {summary[f'mAP@{k}']:.2f}")
+    print(f"Overall nDCG@{k}: {summary[f'nDCG@{k}']:.2f}")
+    print(f"[Info] evaluation of {len(df)} queries took {time.perf_counter() - start:.3f}s")
 
 if __name__ == "__main__":
     main()
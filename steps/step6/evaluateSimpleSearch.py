@@ -1,13 +1,12 @@
-import os
+import time
 
-from simpleSearch import searchObject
+import numpy as np
 
-import pandas as pd
+from simpleSearch import search_many
+from descriptorStore import load_descriptor_store
 
 
-
-
-df = pd.read_csv("steps/AxelHoekje/dataBaseFinal.csv")
+store = load_descriptor_store("steps/AxelHoekje/dataBaseFinal.csv")
 
 results = {
     0: 0,
@@ -22,35 +21,16 @@ results = {
     9: 0,
     10: 0
 }
-iteration = 0
-for object in df.iterrows():
-    # create the features for the search query
-    object_features = []
-    # print(object[1]["name"]) # name of class
-    object_features.append(object[1]["surfaceAreaObj"])
-    object_features.append(object[1]["compactnessObj"])
-    object_features.append(object[1]["rectangularityObj"])
-    object_features.append(object[1]["diameterObj"])
-    object_features.append(object[1]["convexityObj"])
-    object_features.append(object[1]["eccentricityObj"])
-    object_features.append(eval(object[1]["A3"]))
-    object_features.append(eval(object[1]["D1"]))
-    object_features.append(eval(object[1]["D2"]))
-    object_features.append(eval(object[1]["D3"]))
-    object_features.append(eval(object[1]["D4"]))
-
-    object_class = object[1]["class"]
-    
-    # fetch results
-    result = searchObject(100000, 93, object_features)
-
-    top10_classes = result.distances.head(10)["class"].tolist()
-    class_overlap = top10_classes.count("AircraftBuoyant")
 
-    results[class_overlap] += 1
+# every database object is a search query, all of them are scored in one batched pass
+start = time.perf_counter()
+top10, _ = search_many(store.matrix, store, k=10)
+print(f"[Info]: {len(store)} queries done in {time.perf_counter() - start:.2f}s")
 
-    iteration += 1
-    print(f"[Info]: {iteration} / 2483 items done ({round((iteration / 2483) * 100, 2)}%) --> {results}")
+top10_classes = store.classes[top10]
+class_overlaps = np.sum(top10_classes == "AircraftBuoyant", axis=1)
+for class_overlap, count in zip(*np.unique(class_overlaps, return_counts=True)):
+    results[int(class_overlap)] += int(count)
 
 print("\n--------------------------------------------------------------------------------------------")
 print(results)
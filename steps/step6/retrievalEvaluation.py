@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+############################################################################################
+# Vectorized leave-one-out evaluation: every database shape is a query, all queries in one batch
+############################################################################################
+# ranking   --> Q x k database indices per query, best first, without the query itself (-1 = nothing found)
+# relevant  --> same class as the query, so every shape has (class size - 1) relevant shapes
+# the metrics are per query arrays, averaged over all queries and per class
+
+def encode_classes(classes):
+    """Integer code per shape, the class names and the number of shapes per class."""
+    class_names, codes = np.unique(np.asarray(classes, dtype=str), return_inverse=True)
+    return codes, class_names, np.bincount(codes)
+
+def drop_self(found):
+    """Q x (k + 1) results of database rows used as queries --> Q x k without the query itself."""
+    is_self = found == np.arange(len(found))[:, None]
+    # drop the query itself where it was found, otherwise the last (k + 1-th) neighbour
+    is_self[~is_self.any(axis=1), -1] = True
+    return found[~is_self].reshape(len(found), found.shape[1] - 1)
+
+def leave_one_out_ranking(index, features, k):
+    """Top k neighbours of every database row with one batched search, the row itself removed."""
+    _, found = index.search(np.asarray(features, dtype=np.float32), k + 1)
+    return drop_self(found)
+
+def relevance(ranking, codes):
+    return (ranking >= 0) & (codes[np.maximum(ranking, 0)] == codes[:, None])
+
+def query_metrics(ranking, codes, class_sizes):
+    """precision@k, recall@k, AP@k and nDCG@k of every query (arrays of length Q)."""
+    k = ranking.shape[1]
+    relevant = relevance(ranking, codes)
+    num_relevant = class_sizes[codes] - 1
+    hits = np.cumsum(relevant, axis=1)
+    positions = np.arange(1, k + 1)
+
+    precision = hits[:, -1] / k
+    recall = np.divide(hits[:, -1], num_relevant, out=np.zeros(len(codes)), where=num_relevant > 0)
+
+    # AP@k: precision at every relevant position, divided by the number of relevant shapes that fit in k
+    ideal_hits = np.minimum(num_relevant, k)
+    average_precision = np.divide((hits / positions * relevant).sum(axis=1), ideal_hits,
+                                  out=np.zeros(len(codes)), where=ideal_hits > 0)
+
+    discounts = 1.0 / np.log2(positions + 1)
+    dcg = (relevant * discounts).sum(axis=1)
+    ideal_dcg = np.concatenate([[0.0], np.cumsum(discounts)])[ideal_hits]
+    ndcg = np.divide(dcg, ideal_dcg, out=np.zeros(len(codes)), where=ideal_dcg > 0)
+
+    return {"precision": precision, "recall": recall, "AP": average_precision, "nDCG": ndcg}
+
+def per_class_table(metrics, codes, class_names):
+    """Mean of every metric per class (one row per class, plus the number of shapes)."""
+    counts = np.bincount(codes, minlength=len(class_names))
+    table = {"class": class_names, "shapes": counts}
+    for name, values in metrics.items():
+        table[name] = np.bincount(codes, weights=values, minlength=len(class_names)) / np.maximum(counts, 1)
+    return pd.DataFrame(table)
+
+def evaluate_ranking(ranking, classes, k=None):
+    """Averaged metrics (mAP is the mean AP) and the per-class table of a leave-one-out ranking."""
+    if k is not None:
+        ranking = ranking[:, :k]
+    codes, class_names, class_sizes = encode_classes(classes)
+    metrics = query_metrics(ranking, codes, class_sizes)
+    summary = {f"{name}@{ranking.shape[1]}": float(np.mean(values)) for name, values in metrics.items()}
+    summary[f"mAP@{ranking.shape[1]}"] = summary.pop(f"AP@{ranking.shape[1]}")
+    return summary, per_class_table(metrics, codes, class_names)
+
+def evaluate_index(index, features, classes, k=5):
+    """Leave-one-out evaluation of a built index (anything with a batched search(matrix, k), e.g. FaissIndex)."""
+    return evaluate_ranking(leave_one_out_ranking(index, features, k), classes)
+
+############################################################################################
+# Curves from one (long) ranking: every k up to k_max at once
+############################################################################################
+# with k_max = N - 1 the ranking is complete and AP / R-precision are exact, with a smaller k_max
+# the shapes beyond k_max simply count as not retrieved
+
+RECALL_LEVELS = np.linspace(0, 1, 11)
+
+def precision_recall_at_every_k(ranking, codes, class_sizes):
+    """Q x k_max precision and recall after each retrieved shape, plus the relevance matrix."""
+    relevant = relevance(ranking, codes)
+    num_relevant = class_sizes[codes] - 1
+    hits = np.cumsum(relevant, axis=1)
+    precision = hits / np.arange(1, ranking.shape[1] + 1)
+    recall = np.divide(hits, num_relevant[:, None], out=np.zeros(hits.shape), where=num_relevant[:, None] > 0)
+    return precision, recall, relevant
+
+def interpolated_precision(precision, recall, levels=RECALL_LEVELS):
+    """Q x levels: the best precision at any recall >= level (0 when the ranking never gets there)."""
+    best_from_here = np.maximum.accumulate(precision[:, ::-1], axis=1)[:, ::-1]
+    rows = np.arange(len(precision))
+    result = np.zeros((len(precision), len(levels)))
+    for column, level in enumerate(levels):
+        reached = recall >= level - 1e-12
+        first = np.argmax(reached, axis=1)
+        result[:, column] = np.where(reached[rows, first], best_from_here[rows, first], 0.0)
+    return result
+
+def evaluate_curves(ranking, classes, levels=RECALL_LEVELS):
+    """Summary (mAP, R-precision, AUC), per-class table and mean interpolated PR curve of one ranking."""
+    codes, class_names, class_sizes = encode_classes(classes)
+    precision, recall, relevant = precision_recall_at_every_k(ranking, codes, class_sizes)
+    num_relevant = class_sizes[codes] - 1
+    rows = np.arange(len(codes))
+
+    # R-precision: precision after as many shapes as the query has relevant ones
+    r_positions = np.clip(num_relevant, 1, ranking.shape[1]) - 1
+    r_precision = np.where(num_relevant > 0, relevant.cumsum(axis=1)[rows, r_positions] / np.maximum(num_relevant, 1), 0.0)
+    average_precision = np.divide((precision * relevant).sum(axis=1), num_relevant,
+                                  out=np.zeros(len(codes)), where=num_relevant > 0)
+    curves = interpolated_precision(precision, recall, levels)
+    auc = np.trapezoid(curves, levels, axis=1) if hasattr(np, "trapezoid") else np.trapz(curves, levels, axis=1)
+
+    metrics = {"AP": average_precision, "R-precision": r_precision, "AUC": auc}
+    summary = {"mAP": float(average_precision.mean()), "R-precision": float(r_precision.mean()), "AUC": float(auc.mean())}
+    for k in (1, 5, 10):
+        if k <= ranking.shape[1]:
+            summary[f"precision@{k}"] = float(precision[:, k - 1].mean())
+            summary[f"recall@{k}"] = float(recall[:, k - 1].mean())
+    return summary, per_class_table(metrics, codes, class_names), curves.mean(axis=0)
+